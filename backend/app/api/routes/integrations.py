@@ -1,23 +1,44 @@
 ﻿from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 
 from app.auth.dependencies import require_role
-from app.crud import patient as patient_crud
-from app.db.session import get_db
+from app.core.admission import limited
+from app.db.session import Database, get_database
 from app.models.user import User, UserRole
-from app.schemas.integration import ImportPatientsRequest
+from app.schemas.integration import ImportPatientsRequest, ImportResult, StreamImportResult
+from app.services.importer import (
+    CSV_CONTENT_TYPES,
+    NDJSON_CONTENT_TYPES,
+    import_patient_rows,
+    import_patient_stream,
+)
 
 router = APIRouter(prefix="/integrations", tags=["integrations"])
 
 
-@router.post("/patients/import", status_code=status.HTTP_201_CREATED)
+@router.post("/patients/import", response_model=ImportResult, status_code=status.HTTP_201_CREATED)
+@limited("imports")
 async def import_patients(
     payload: ImportPatientsRequest,
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_database)] = None,
     _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
-) -> dict[str, int]:
-    patient_creates = payload.to_patient_creates()
-    created = patient_crud.bulk_create_patients(db, patient_creates)
-    return {"imported": len(created)}
+) -> ImportResult:
+    return await db.run(import_patient_rows, payload.to_patient_rows(), source_system=payload.source_system)
+
+
+@router.post("/patients/import/stream", response_model=StreamImportResult, status_code=status.HTTP_201_CREATED)
+@limited("imports")
+async def import_patients_stream(
+    request: Request,
+    source_system: str | None = Query(default=None, max_length=64),
+    db: Annotated[Database, Depends(get_database)] = None,
+    _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
+) -> StreamImportResult:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES | CSV_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use application/x-ndjson or text/csv",
+        )
+    return await import_patient_stream(db, request.stream(), content_type=content_type, source_system=source_system)
@@ -0,0 +1,98 @@
+﻿from datetime import date
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse
+
+from app.auth.dependencies import get_current_user, require_role
+from app.crud import job as job_crud
+from app.db.session import Database, get_database
+from app.models.job import Job, JobKind, JobStatus
+from app.models.user import User, UserRole
+from app.schemas.job import JobRead
+from app.services.export import EXPORT_FORMATS
+from app.services.importer import CSV_CONTENT_TYPES, NDJSON_CONTENT_TYPES
+from app.services.jobs import get_job_runner, upload_path
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("/exports", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def submit_export(
+    start_date: date | None = Query(default=None),
+    end_date: date | None = Query(default=None),
+    name: str | None = Query(default=None),
+    format: Literal["xlsx", "csv"] = Query(default="xlsx"),
+    db: Annotated[Database, Depends(get_database)] = None,
+    current_user: Annotated[User, Depends(get_current_user)] = None,
+) -> JobRead:
+    params = {
+        "format": format,
+        "name": name,
+        "start_date": start_date.isoformat() if start_date else None,
+        "end_date": end_date.isoformat() if end_date else None,
+    }
+    job = await db.run(job_crud.create_job, JobKind.EXPORT, params=params, created_by=current_user.id)
+    get_job_runner().submit(job.id)
+    return JobRead.model_validate(job)
+
+
+@router.post("/imports", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def submit_import(
+    request: Request,
+    source_system: str | None = Query(default=None, max_length=64),
+    db: Annotated[Database, Depends(get_database)] = None,
+    current_user: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
+) -> JobRead:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES | CSV_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use application/x-ndjson or text/csv",
+        )
+
+    job = await db.run(
+        job_crud.create_job,
+        JobKind.IMPORT,
+        params={"content_type": content_type, "source_system": source_system},
+        created_by=current_user.id,
+    )
+    try:
+        with upload_path(job.id).open("wb") as handle:
+            async for chunk in request.stream():
+                handle.write(chunk)
+    except Exception as exc:
+        upload_path(job.id).unlink(missing_ok=True)
+        await db.run(job_crud.mark_finished, job.id, status=JobStatus.FAILED, error=f"Upload interrupted: {exc}")
+        raise
+    get_job_runner().submit(job.id)
+    return JobRead.model_validate(job)
+
+
+async def _get_owned_job(db: Database, job_id: str, user: User) -> Job:
+    job = await db.run(job_crud.get_job, job_id)
+    if job is None or (job.created_by != user.id and user.role != UserRole.ADMIN):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: str,
+    db: Annotated[Database, Depends(get_database)] = None,
+    current_user: Annotated[User, Depends(get_current_user)] = None,
+) -> JobRead:
+    return JobRead.model_validate(await _get_owned_job(db, job_id, current_user))
+
+
+@router.get("/{job_id}/download")
+async def download_job_result(
+    job_id: str,
+    db: Annotated[Database, Depends(get_database)] = None,
+    current_user: Annotated[User, Depends(get_current_user)] = None,
+) -> FileResponse:
+    job = await _get_owned_job(db, job_id, current_user)
+    if job.status != JobStatus.SUCCEEDED or not job.file_path:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job has no downloadable result yet")
+    media_type, filename = EXPORT_FORMATS[job.params["format"]]
+    return FileResponse(job.file_path, media_type=media_type, filename=filename)
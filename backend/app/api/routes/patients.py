@@ -1,51 +1,115 @@
 ﻿from datetime import date
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from app.auth.dependencies import get_current_user, require_role
+from app.core import events
+from app.core.response_cache import cached_json
 from app.crud import patient as patient_crud
-from app.db.session import get_db
+from app.db.session import Database, get_database, get_read_database
 from app.models.user import User, UserRole
 from app.schemas.patient import (
+    BulkDeleteRequest,
+    BulkDeleteResult,
+    BulkUpdateResult,
     PatientCreate,
     PatientRead,
     PatientUpdate,
     PatientsListResponse,
+    ReassignDokterRequest,
 )
+from app.services import columnar
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
 
 @router.get("", response_model=PatientsListResponse)
 async def list_patients(
+    request: Request,
     skip: int = 0,
     limit: Annotated[int, Query(le=100)] = 50,
     name: str | None = Query(default=None, description="Filter by patient name"),
     start_date: date | None = Query(default=None, description="Filter visit date >= start_date"),
     end_date: date | None = Query(default=None, description="Filter visit date <= end_date"),
-    db: Annotated[Session, Depends(get_db)] = None,
+    cursor: str | None = Query(default=None, description="Opaque next_cursor from the previous page; overrides skip"),
+    count: patient_crud.CountMode = Query(default="exact", description="How to compute total: exact, estimated or none"),
+    db: Annotated[Database, Depends(get_read_database)] = None,
     _: Annotated[User, Depends(get_current_user)] = None,
-) -> PatientsListResponse:
-    patients, total = patient_crud.list_patients(
-        db,
-        skip=skip,
-        limit=limit,
-        name=name,
-        start_date=start_date,
-        end_date=end_date,
+) -> Response:
+    try:
+        seek = patient_crud.decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from exc
+    representation = columnar.negotiate(request)
+
+    async def build() -> dict:
+        patients, total = await db.run(
+            patient_crud.list_patients,
+            skip=skip,
+            limit=limit,
+            name=name,
+            start_date=start_date,
+            end_date=end_date,
+            cursor=seek,
+            count=count,
+        )
+        next_cursor = patient_crud.encode_cursor(patients[-1]) if len(patients) == limit else None
+        return {"items": patients, "total": total, "next_cursor": next_cursor}
+
+    return await cached_json(
+        request,
+        build,
+        media_type=representation,
+        render=columnar.renderer(representation, rows_key="items"),
+    )
+
+
+@router.get("/search", response_model=PatientsListResponse)
+async def search_patients(
+    request: Request,
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Words or word prefixes to match")],
+    skip: int = 0,
+    limit: Annotated[int, Query(le=100)] = 50,
+    count: patient_crud.CountMode = Query(default="exact", description="How to compute total: exact, estimated or none"),
+    db: Annotated[Database, Depends(get_read_database)] = None,
+    _: Annotated[User, Depends(get_current_user)] = None,
+) -> Response:
+    representation = columnar.negotiate(request)
+
+    async def build() -> dict:
+        patients, total = await db.run(patient_crud.search_patients, q, skip=skip, limit=limit, count=count)
+        return {"items": patients, "total": total, "next_cursor": None}
+
+    return await cached_json(
+        request,
+        build,
+        media_type=representation,
+        render=columnar.renderer(representation, rows_key="items"),
+    )
+
+
+@router.get("/events")
+async def patient_events(
+    last_event_id: Annotated[str | None, Header(max_length=64)] = None,
+    _: Annotated[User, Depends(get_current_user)] = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        events.stream_events(last_event_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx from holding events back until its buffer fills.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    return PatientsListResponse(items=patients, total=total)
 
 
 @router.get("/{patient_id}", response_model=PatientRead)
 async def get_patient(
     patient_id: int,
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_read_database)] = None,
     _: Annotated[User, Depends(get_current_user)] = None,
 ) -> PatientRead:
-    patient = patient_crud.get_patient(db, patient_id)
+    patient = await db.run(patient_crud.get_patient, patient_id)
     if not patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
     return PatientRead.model_validate(patient)
@@ -54,10 +118,10 @@ async def get_patient(
 @router.post("", response_model=PatientRead, status_code=status.HTTP_201_CREATED)
 async def create_patient(
     payload: PatientCreate,
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_database)] = None,
     _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
 ) -> PatientRead:
-    patient = patient_crud.create_patient(db, payload)
+    patient = await db.run(patient_crud.create_patient, payload)
     return PatientRead.model_validate(patient)
 
 
@@ -65,23 +129,47 @@ async def create_patient(
 async def update_patient(
     patient_id: int,
     payload: PatientUpdate,
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_database)] = None,
     _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
 ) -> PatientRead:
-    patient = patient_crud.get_patient(db, patient_id)
-    if not patient:
+    updated = await db.run(patient_crud.update_patient, patient_id, payload)
+    if updated is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    updated = patient_crud.update_patient(db, patient, payload)
     return PatientRead.model_validate(updated)
 
 
 @router.delete("/{patient_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_patient(
     patient_id: int,
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_database)] = None,
     _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
 ) -> None:
-    patient = patient_crud.get_patient(db, patient_id)
-    if not patient:
+    if not await db.run(patient_crud.delete_patient, patient_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    patient_crud.delete_patient(db, patient)
+
+
+@router.post("/bulk/reassign-dokter", response_model=BulkUpdateResult)
+async def reassign_dokter(
+    payload: ReassignDokterRequest,
+    db: Annotated[Database, Depends(get_database)] = None,
+    _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
+) -> BulkUpdateResult:
+    updated = await db.run(
+        patient_crud.reassign_dokter,
+        from_dokter=payload.from_dokter,
+        to_dokter=payload.to_dokter,
+        start_date=payload.start_date,
+        end_date=payload.end_date,
+    )
+    return BulkUpdateResult(updated=updated)
+
+
+@router.post("/bulk/delete", response_model=BulkDeleteResult)
+async def delete_patients(
+    payload: BulkDeleteRequest,
+    db: Annotated[Database, Depends(get_database)] = None,
+    _: Annotated[User, Depends(require_role(UserRole.DOKTER))] = None,
+) -> BulkDeleteResult:
+    deleted = await db.run(patient_crud.delete_patients, payload.ids)
+    missing = sorted(set(payload.ids) - set(deleted))
+    return BulkDeleteResult(deleted=len(deleted), missing=missing)
@@ -1,86 +1,83 @@
 ﻿from datetime import date
-from io import BytesIO
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from openpyxl import Workbook
-from sqlalchemy.orm import Session
 
 from app.auth.dependencies import get_current_user
+from app.core.admission import limited
+from app.core.response_cache import cached_json
 from app.crud import patient as patient_crud
-from app.db.session import get_db
+from app.db.session import Database, get_read_database
 from app.models.user import User
-from app.schemas.patient import PatientRead, PatientReport, PatientSummary
+from app.schemas.patient import PatientReport, PatientSummary
+from app.services import columnar
+from app.services.export import EXPORT_FORMATS, stream_export
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
 
 @router.get("/patients", response_model=PatientReport)
+@limited("reports")
 async def patient_report(
+    request: Request,
     start_date: date | None = Query(default=None),
     end_date: date | None = Query(default=None),
     name: str | None = Query(default=None),
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_read_database)] = None,
     _: Annotated[User, Depends(get_current_user)] = None,
-) -> PatientReport:
-    patients, _ = patient_crud.list_patients(
-        db,
-        skip=0,
-        limit=500,
-        name=name,
-        start_date=start_date,
-        end_date=end_date,
+) -> Response:
+    representation = columnar.negotiate(request)
+
+    async def build() -> dict:
+        patients, _ = await db.run(
+            patient_crud.list_patients,
+            skip=0,
+            limit=500,
+            name=name,
+            start_date=start_date,
+            end_date=end_date,
+            count="none",
+        )
+        summary_counts = await db.run(patient_crud.get_summary, start_date=start_date, end_date=end_date, name=name)
+        return {"patients": patients, "summary": summary_counts}
+
+    return await cached_json(
+        request,
+        build,
+        media_type=representation,
+        render=columnar.renderer(representation, rows_key="patients"),
     )
-    summary_counts = patient_crud.get_summary(db, start_date=start_date, end_date=end_date)
-    summary = PatientSummary(**summary_counts)
-    patient_models = [PatientRead.model_validate(p) for p in patients]
-    return PatientReport(patients=patient_models, summary=summary)
 
 
-@router.get("/patients/export")
-async def export_patients_excel(
+@router.get("/patients/summary", response_model=PatientSummary)
+async def patient_summary(
+    request: Request,
     start_date: date | None = Query(default=None),
     end_date: date | None = Query(default=None),
     name: str | None = Query(default=None),
-    db: Annotated[Session, Depends(get_db)] = None,
+    db: Annotated[Database, Depends(get_read_database)] = None,
     _: Annotated[User, Depends(get_current_user)] = None,
-) -> StreamingResponse:
-    patients, _ = patient_crud.list_patients(
-        db,
-        skip=0,
-        limit=1000,
-        name=name,
-        start_date=start_date,
-        end_date=end_date,
-    )
+) -> Response:
+    async def build() -> dict:
+        return await db.run(patient_crud.get_summary, start_date=start_date, end_date=end_date, name=name)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Patients"
-    headers = ["ID", "Nama", "Tanggal Lahir", "Tanggal Kunjungan", "Diagnosis", "Tindakan", "Dokter"]
-    ws.append(headers)
-    for patient in patients:
-        ws.append(
-            [
-                patient.id,
-                patient.name,
-                patient.tanggal_lahir.isoformat(),
-                patient.tanggal_kunjungan.isoformat(),
-                patient.diagnosis,
-                patient.tindakan,
-                patient.dokter,
-            ]
-        )
+    return await cached_json(request, build)
 
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
 
-    filename = "patients-report.xlsx"
+@router.get("/patients/export")
+@limited("exports")
+async def export_patients_excel(
+    start_date: date | None = Query(default=None),
+    end_date: date | None = Query(default=None),
+    name: str | None = Query(default=None),
+    format: Literal["xlsx", "csv"] = Query(default="xlsx"),
+    _: Annotated[User, Depends(get_current_user)] = None,
+) -> StreamingResponse:
+    media_type, filename = EXPORT_FORMATS[format]
     headers_response = {"Content-Disposition": f"attachment; filename={filename}"}
     return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        stream_export(format, name=name, start_date=start_date, end_date=end_date),
+        media_type=media_type,
         headers=headers_response,
     )
@@ -1,12 +1,14 @@
-﻿import logging
+﻿import hashlib
+import logging
+import threading
 import time
 from typing import Any, Dict
 
-import requests
 from fastapi import HTTPException, status
-from jose import jwt
 
+from app.core.cache import TTLCache
 from app.core.config import get_settings
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
@@ -14,51 +16,95 @@ logger = logging.getLogger(__name__)
 class Auth0TokenVerifier:
     def __init__(self) -> None:
         self.settings = get_settings()
-        self._jwks: list[dict[str, Any]] | None = None
+        self._keys: dict[str, dict[str, Any]] = {}
         self._jwks_last_fetched: float = 0.0
+        self._jwks_lock = threading.Lock()
+        self._token_cache = TTLCache(maxsize=self.settings.auth0_token_cache_size)
 
     @property
     def jwks_url(self) -> str:
+        if self.settings.auth0_jwks_url:
+            return self.settings.auth0_jwks_url
         domain = self.settings.auth0_domain.rstrip("/")
         return f"https://{domain}/.well-known/jwks.json"
 
     def _refresh_jwks(self) -> None:
+        # requests is only needed for this fetch; importing it lazily keeps it off the worker boot path.
+        import requests
+
         logger.debug("Fetching JWKS from %s", self.jwks_url)
         response = requests.get(self.jwks_url, timeout=5)
         response.raise_for_status()
         jwks = response.json().get("keys", [])
         if not jwks:
             raise RuntimeError("Auth0 JWKS response did not include keys")
-        self._jwks = jwks
+        self._keys = {
+            key["kid"]: {
+                "kty": key["kty"],
+                "kid": key["kid"],
+                "use": key.get("use", "sig"),
+                "n": key["n"],
+                "e": key["e"],
+            }
+            for key in jwks
+            if key.get("kid")
+        }
         self._jwks_last_fetched = time.time()
 
-    def _get_jwks(self) -> list[dict[str, Any]]:
-        if not self._jwks or time.time() - self._jwks_last_fetched > 3600:
-            self._refresh_jwks()
-        assert self._jwks is not None
-        return self._jwks
+    def _jwks_expired(self) -> bool:
+        return not self._keys or time.time() - self._jwks_last_fetched > self.settings.auth0_jwks_cache_ttl
+
+    def _should_refresh(self, kid: str | None) -> bool:
+        if self._jwks_expired():
+            return True
+        if kid in self._keys:
+            return False
+        # Unknown kid: the tenant may have rotated keys, but never hammer Auth0 with garbage kids.
+        return time.time() - self._jwks_last_fetched >= self.settings.auth0_jwks_min_refresh_interval
+
+    def _get_signing_key(self, kid: str | None) -> dict[str, Any] | None:
+        if not self._should_refresh(kid):
+            return self._keys.get(kid)
+
+        fetched_at = self._jwks_last_fetched
+        with self._jwks_lock:
+            # Only the first caller of a burst fetches; the rest reuse its result.
+            if self._jwks_last_fetched == fetched_at and self._should_refresh(kid):
+                self._refresh_jwks()
+        return self._keys.get(kid)
+
+    def warm(self) -> None:
+        from jose import jwt  # noqa: F401
+
+        with self._jwks_lock:
+            if self._jwks_expired():
+                self._refresh_jwks()
+
+    @staticmethod
+    def _cache_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_cached_payload(self, token: str) -> Dict[str, Any] | None:
+        payload = self._token_cache.get(self._cache_key(token))
+        return dict(payload) if payload is not None else None
 
     def verify_token(self, token: str) -> Dict[str, Any]:
+        cached = self.get_cached_payload(token)
+        if cached is not None:
+            return cached
+
+        from jose import jwt
+
         try:
             unverified_header = jwt.get_unverified_header(token)
         except jwt.JWTError as exc:  # pragma: no cover - invalid tokens rejected
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authorization header") from exc
 
-        jwks = self._get_jwks()
-        rsa_key = next((
-            {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"],
-            }
-            for key in jwks
-            if key.get("kid") == unverified_header.get("kid")
-        ), None)
+        kid = unverified_header.get("kid")
+        rsa_key = self._get_signing_key(kid)
 
         if not rsa_key:
-            logger.warning("No matching JWKS key found for kid %s", unverified_header.get("kid"))
+            logger.warning("No matching JWKS key found for kid %s", kid)
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token signature")
 
         try:
@@ -77,9 +123,30 @@ class Auth0TokenVerifier:
             logger.exception("Failed to decode token")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials") from exc
 
+        expires_at = payload.get("exp")
+        if isinstance(expires_at, (int, float)):
+            self._token_cache.set(self._cache_key(token), dict(payload), expires_at=float(expires_at))
         return payload
 
 
+_verifier: Auth0TokenVerifier | None = None
+_verifier_lock = threading.Lock()
+
+
+def get_token_verifier() -> Auth0TokenVerifier:
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = Auth0TokenVerifier()
+    return _verifier
+
+
+def get_cached_token_payload(token: str) -> Dict[str, Any] | None:
+    with timed("auth"):
+        return get_token_verifier().get_cached_payload(token)
+
+
 def get_token_payload(token: str) -> Dict[str, Any]:
-    verifier = Auth0TokenVerifier()
-    return verifier.verify_token(token)
+    with timed("auth"):
+        return get_token_verifier().verify_token(token)
@@ -1,18 +1,23 @@
-﻿from collections.abc import Callable
+﻿import hashlib
+import json
+from collections.abc import Callable
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
 
-from app.auth.auth0 import get_token_payload
+from app.auth.auth0 import get_cached_token_payload, get_token_payload
+from app.core.cache import TTLCache
 from app.core.config import get_settings
 from app.crud.user import upsert_user
-from app.db.session import get_db
+from app.db.session import Database, get_database
 from app.models.user import User, UserRole
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+_user_cache = TTLCache(maxsize=get_settings().user_cache_size, ttl=get_settings().user_cache_ttl)
+
 
 def _extract_role(claims: dict) -> UserRole:
     settings = get_settings()
@@ -30,15 +35,23 @@ def _extract_role(claims: dict) -> UserRole:
         return UserRole(settings.default_role)
 
 
+def _identity_key(sub: str, email: str, full_name: str | None, role: UserRole) -> tuple[str, str]:
+    digest = hashlib.sha256(json.dumps([email, full_name, role.value]).encode("utf-8")).hexdigest()
+    return sub, digest
+
+
 async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(bearer_scheme)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[Database, Depends(get_database)],
 ) -> User:
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing")
 
     token = credentials.credentials
-    claims = get_token_payload(token)
+    claims = get_cached_token_payload(token)
+    if claims is None:
+        # A cache miss may need a JWKS fetch; keep that blocking I/O off the event loop.
+        claims = await run_in_threadpool(get_token_payload, token)
 
     sub = claims.get("sub")
     email = claims.get("email")
@@ -47,7 +60,11 @@ async def get_current_user(
 
     full_name = claims.get("name")
     role = _extract_role(claims)
-    user = upsert_user(db, auth0_id=sub, email=email, full_name=full_name, role=role)
+    cache_key = _identity_key(sub, email, full_name, role)
+    user = _user_cache.get(cache_key)
+    if user is None:
+        user = await db.run(upsert_user, auth0_id=sub, email=email, full_name=full_name, role=role)
+        _user_cache.set(cache_key, user)
     return user
 
 
@@ -0,0 +1,198 @@
+﻿import asyncio
+import hashlib
+import logging
+from collections import Counter, deque
+from collections.abc import Callable, Mapping, Sequence
+from typing import TypeVar
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.auth.auth0 import get_cached_token_payload
+
+logger = logging.getLogger(__name__)
+
+Endpoint = TypeVar("Endpoint", bound=Callable)
+
+
+def limited(route_class: str) -> Callable[[Endpoint], Endpoint]:
+    def decorator(endpoint: Endpoint) -> Endpoint:
+        endpoint.admission_class = route_class
+        return endpoint
+
+    return decorator
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class RouteLimiter:
+    # All state lives on one worker's event loop, so plain counters need no locking.
+    def __init__(self, name: str, *, concurrency: int, per_user: int, queue_size: int, queue_timeout: float) -> None:
+        self.name = name
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._users: Counter = Counter()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, status_code: int, detail: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(status_code, detail)
+
+    async def acquire(self, user: str) -> None:
+        # A user's queued requests count against their limit too, so one person cannot fill the queue.
+        if self._users[user] >= self.per_user:
+            raise self._reject(429, f"Too many concurrent {self.name} requests for this user")
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._users[user] += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise self._reject(503, f"Server is busy with other {self.name} requests")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._users[user] += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as exc:
+            self._forget(user)
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this request gave up; pass it on.
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject(503, f"Timed out waiting for a free {self.name} slot") from None
+            raise
+
+    def release(self, user: str) -> None:
+        self._forget(user)
+        self._release_slot()
+
+    def _forget(self, user: str) -> None:
+        self._users[user] -= 1
+        if not self._users[user]:
+            del self._users[user]
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter; active stays the same.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "limit": self.concurrency,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+        }
+
+
+def create_limiters(
+    concurrency: Mapping[str, int],
+    per_user: Mapping[str, int],
+    *,
+    queue_size: int,
+    queue_timeout: float,
+) -> dict[str, RouteLimiter]:
+    return {
+        name: RouteLimiter(
+            name,
+            concurrency=limit,
+            per_user=per_user.get(name, limit),
+            queue_size=queue_size,
+            queue_timeout=queue_timeout,
+        )
+        for name, limit in concurrency.items()
+    }
+
+
+def _user_key(scope: Scope) -> str:
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    payload = get_cached_token_payload(token)
+    if payload and payload.get("sub"):
+        return payload["sub"]
+    # First request with this token: it is verified later, so key on the token itself.
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        routes: Sequence[BaseRoute],
+        limiters: Mapping[str, RouteLimiter],
+        retry_after: int = 5,
+    ) -> None:
+        self.app = app
+        self.retry_after = retry_after
+        self.limiters = limiters
+        self._all_routes = routes
+        self._limited_routes: list[tuple[BaseRoute, RouteLimiter]] | None = None
+
+    def _routes(self) -> list[tuple[BaseRoute, RouteLimiter]]:
+        # Routers are included after middleware is added, so the marked routes are collected on first use.
+        if self._limited_routes is None:
+            self._limited_routes = [
+                (route, self.limiters[route.endpoint.admission_class])
+                for route in self._all_routes
+                if getattr(getattr(route, "endpoint", None), "admission_class", None) in self.limiters
+            ]
+        return self._limited_routes
+
+    def _match(self, scope: Scope) -> RouteLimiter | None:
+        for route, limiter in self._routes():
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                # Rejected requests never reach the router; this keeps them attributed to their route in metrics.
+                scope.setdefault("route", route)
+                return limiter
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limiter = self._match(scope) if scope["type"] == "http" else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        user = _user_key(scope)
+        try:
+            await limiter.acquire(user)
+        except AdmissionRejected as exc:
+            logger.info("Rejected %s request with %s: %s", limiter.name, exc.status_code, exc.detail)
+            response = JSONResponse(
+                {"detail": exc.detail},
+                status_code=exc.status_code,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            # Streaming exports finish sending inside this call, so the slot is held until the last byte.
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(user)
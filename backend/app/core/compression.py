@@ -0,0 +1,144 @@
+﻿import zlib
+from collections.abc import Iterable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+class _GzipEncoder:
+    def __init__(self, level: int) -> None:
+        # wbits=31 writes a gzip header and trailer around the deflate stream.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # A sync flush hands each chunk to the client now instead of holding it for a better ratio.
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    encodings: dict[str, float] = {}
+    for item in header.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            encodings[name.lower()] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        minimum_size: int = 1024,
+        content_types: Iterable[str] = ("application/json",),
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        brotli_enabled: bool = True,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = frozenset(content_types)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli_enabled = brotli_enabled and brotli is not None
+
+    def _choose_encoding(self, scope: Scope) -> str | None:
+        accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if self.brotli_enabled and accepted.get("br", 0) > 0:
+            return "br"
+        if accepted.get("gzip", accepted.get("*", 0)) > 0:
+            return "gzip"
+        return None
+
+    def _encoder(self, encoding: str) -> _GzipEncoder | _BrotliEncoder:
+        return _BrotliEncoder(self.brotli_quality) if encoding == "br" else _GzipEncoder(self.gzip_level)
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        # xlsx, parquet and other zip-based payloads are absent from the allow list on purpose.
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if media_type not in self.content_types:
+            return False
+        length = headers.get("content-length")
+        return length is None or int(length) >= self.minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        encoder: _GzipEncoder | _BrotliEncoder | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether compression pays off.
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(scope=start)
+                too_small = not more_body and len(body) < self.minimum_size
+                if start["status"] in (204, 304) or too_small or not self._compressible(headers):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self._encoder(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    compressed = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(start)
+
+            chunk = encoder.compress(body) if body else b""
+            if not more_body:
+                chunk += encoder.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,18 +1,76 @@
 ﻿from functools import lru_cache
-from typing import List
+from typing import Dict, List, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     database_url: str
+    database_async: bool = False
+    database_async_url: str | None = None
+    database_replica_url: str | None = None
+    database_replica_async_url: str | None = None
+    database_replica_max_lag: float = 5.0
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle: int = 1800
+    db_pool_timeout: int = 30
     auth0_domain: str
     auth0_audience: str
     auth0_issuer: str | None = None
     auth0_algorithms: List[str] = ["RS256"]
     auth0_custom_role_claim: str = "https://example.com/roles"
+    auth0_jwks_url: str | None = None
+    auth0_jwks_cache_ttl: int = 3600
+    auth0_jwks_min_refresh_interval: int = 30
+    auth0_token_cache_size: int = 1024
     default_role: str = "admin"
+    user_cache_ttl: int = 300
+    user_cache_size: int = 1024
     backend_cors_origins: List[str] = ["http://localhost:5173"]
+    auto_migrate: bool = True
+    startup_warmup: bool = True
+    startup_warm_connections: int = 2
+    admission_control: bool = True
+    admission_concurrency: Dict[str, int] = {"reports": 4, "exports": 2, "imports": 2}
+    admission_per_user: Dict[str, int] = {"reports": 2, "exports": 1, "imports": 1}
+    admission_queue_size: int = 16
+    admission_queue_timeout: float = 10.0
+    admission_retry_after: int = 5
+    metrics_enabled: bool = False
+    metrics_server_timing: bool = True
+    export_batch_size: int = 1000
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024
+    compression_content_types: List[str] = [
+        "application/json",
+        "application/vnd.rumahsakit.columnar+json",
+        "application/vnd.apache.arrow.stream",
+        "application/x-ndjson",
+        "text/csv",
+    ]
+    compression_gzip_level: int = 6
+    compression_brotli: bool = True
+    compression_brotli_quality: int = 4
+    patient_events_buffer: int = 1000
+    patient_events_queue_size: int = 256
+    patient_events_heartbeat: int = 15
+    patient_events_retry_ms: int = 3000
+    response_cache_backend: Literal["memory", "redis", "none"] = "memory"
+    response_cache_url: str | None = None
+    response_cache_ttl: int = 60
+    response_cache_size: int = 256
+    import_batch_size: int = 5000
+    import_use_copy: bool = True
+    jobs_runner: Literal["process", "local"] = "process"
+    jobs_workers: int = 2
+    jobs_storage_dir: str = "var/jobs"
+    patients_partitioning: bool = False
+    patients_partition_interval: Literal["month", "year"] = "month"
+    patients_partitions_ahead: int = 3
+    patients_partition_retention: int = 0
+    patients_partition_archive_schema: str = "archive"
+    patients_partition_maintenance_interval: int = 6 * 3600
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
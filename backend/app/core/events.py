@@ -0,0 +1,221 @@
+﻿import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator
+
+import orjson
+from sqlalchemy import event, func, make_url, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "patient_events"
+# Bulk events list affected ids only up to this many; beyond it clients refetch. Keeps NOTIFY under its 8000 byte cap.
+MAX_EVENT_IDS = 200
+
+_PENDING = "patient_events"
+_OVERFLOW = object()
+_RESET = object()
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, item) -> None:
+        if self.queue.full():
+            # A stalled client is cut off rather than buffered forever; it reconnects with Last-Event-ID.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            item = _OVERFLOW
+        self.queue.put_nowait(item)
+
+
+class PatientEventBroadcaster:
+    def __init__(self, buffer_size: int, queue_size: int) -> None:
+        self._history: deque[tuple[str, bytes]] = deque(maxlen=buffer_size)
+        self._subscribers: set[Subscription] = set()
+        self._queue_size = queue_size
+        self._lock = threading.Lock()
+
+    def publish(self, event_id: str, data: bytes) -> None:
+        with self._lock:
+            self._history.append((event_id, data))
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._deliver(subscription, (event_id, data))
+
+    def reset(self) -> None:
+        # Events may have been missed (listener reconnect); nobody can resume across the gap.
+        with self._lock:
+            self._history.clear()
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._deliver(subscription, _RESET)
+
+    def _deliver(self, subscription: Subscription, item) -> None:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.offer, item)
+        except RuntimeError:
+            # The subscriber's event loop is already closed.
+            self.unsubscribe(subscription)
+
+    def subscribe(self, last_event_id: str | None) -> tuple[Subscription, list[tuple[str, bytes]] | None]:
+        subscription = Subscription(asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is None:
+                return subscription, []
+            ids = [event_id for event_id, _ in self._history]
+            if last_event_id not in ids:
+                return subscription, None
+            # Ids are opaque; resuming means "everything that arrived after it", which is commit order.
+            return subscription, list(self._history)[ids.index(last_event_id) + 1 :]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+class PostgresListener:
+    def __init__(self, url: str, broadcaster: PatientEventBroadcaster) -> None:
+        self._conninfo = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._broadcaster = broadcaster
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="patient-events-listener", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        import psycopg
+
+        delay = 1.0
+        while not self._stopped.is_set():
+            try:
+                with psycopg.connect(self._conninfo, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    delay = 1.0
+                    while not self._stopped.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            event_id, _, data = notify.payload.partition(" ")
+                            self._broadcaster.publish(event_id, data.encode("utf-8"))
+            except Exception:
+                logger.warning("Patient event listener lost its connection; retrying in %.0fs", delay, exc_info=True)
+                self._broadcaster.reset()
+                self._stopped.wait(delay)
+                delay = min(delay * 2, 30.0)
+
+
+_broadcaster: PatientEventBroadcaster | None = None
+_listener: PostgresListener | None = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster() -> PatientEventBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                settings = get_settings()
+                _broadcaster = PatientEventBroadcaster(settings.patient_events_buffer, settings.patient_events_queue_size)
+    return _broadcaster
+
+
+def _ensure_listener() -> None:
+    global _listener
+    from app.db.session import engine
+
+    if engine.dialect.name != "postgresql" or _listener is not None:
+        return
+    with _broadcaster_lock:
+        if _listener is None:
+            # Started on the first subscriber, so workers nobody streams from never hold a LISTEN connection.
+            _listener = PostgresListener(get_settings().database_url, get_broadcaster())
+            _listener.start()
+
+
+def stop_listener() -> None:
+    global _listener
+    with _broadcaster_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def record(db: Session, payload: dict) -> None:
+    event_id = uuid.uuid4().hex
+    data = orjson.dumps(payload)
+    if db.get_bind().dialect.name == "postgresql":
+        # NOTIFY is transactional: it is delivered to every worker on commit, in commit order, and dropped on rollback.
+        db.execute(select(func.pg_notify(CHANNEL, f"{event_id} {data.decode('utf-8')}")))
+    else:
+        db.info.setdefault(_PENDING, []).append((event_id, data))
+
+
+def ids_payload(op: str, ids: list[int], **extra) -> dict:
+    if len(ids) > MAX_EVENT_IDS:
+        return {"op": op, "count": len(ids), **extra}
+    return {"op": op, "ids": ids, **extra}
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        broadcaster = get_broadcaster()
+        for event_id, data in pending:
+            broadcaster.publish(event_id, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def _frame(event_id: str, data: bytes) -> bytes:
+    return b"id: " + event_id.encode("ascii") + b"\nevent: patient\ndata: " + data + b"\n\n"
+
+
+async def stream_events(last_event_id: str | None) -> AsyncIterator[bytes]:
+    settings = get_settings()
+    _ensure_listener()
+    broadcaster = get_broadcaster()
+    subscription, backlog = broadcaster.subscribe(last_event_id)
+    try:
+        yield f"retry: {settings.patient_events_retry_ms}\n\n".encode("ascii")
+        if backlog is None:
+            # The resume point fell out of the buffer: the client must refetch before applying new events.
+            yield b"event: reset\ndata: {}\n\n"
+            backlog = []
+        for event_id, data in backlog:
+            yield _frame(event_id, data)
+
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=settings.patient_events_heartbeat)
+            except asyncio.TimeoutError:
+                # Comment lines keep proxies from closing an idle stream.
+                yield f": keep-alive {int(time.time())}\n\n".encode("ascii")
+                continue
+            if item is _OVERFLOW:
+                return
+            if item is _RESET:
+                yield b"event: reset\ndata: {}\n\n"
+                continue
+            yield _frame(*item)
+    finally:
+        broadcaster.unsubscribe(subscription)
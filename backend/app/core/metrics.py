@@ -0,0 +1,200 @@
+﻿import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+@dataclass
+class RequestMetrics:
+    started: float = field(default_factory=time.perf_counter)
+    sql_count: int = 0
+    phases: dict[str, float] = field(default_factory=dict)
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_current: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+def current_metrics() -> RequestMetrics | None:
+    return _current.get()
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - started)
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS_MS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, fraction: float) -> float | None:
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return float(self.buckets[index]) if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+@dataclass
+class RouteStats:
+    latency_ms: Histogram = field(default_factory=Histogram)
+    sql_statements: int = 0
+    sql_ms: float = 0.0
+    phase_ms: dict[str, float] = field(default_factory=dict)
+    statuses: dict[int, int] = field(default_factory=dict)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._routes: dict[tuple[str, str], RouteStats] = {}
+        self._gauges: dict[str, Callable[[], dict | float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, duration_ms: float, metrics: RequestMetrics) -> None:
+        with self._lock:
+            stats = self._routes.setdefault((method, route), RouteStats())
+            stats.latency_ms.observe(duration_ms)
+            stats.sql_statements += metrics.sql_count
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            for phase, seconds in metrics.phases.items():
+                if phase == "db":
+                    stats.sql_ms += seconds * 1000
+                else:
+                    stats.phase_ms[phase] = stats.phase_ms.get(phase, 0.0) + seconds * 1000
+
+    def register_gauge(self, name: str, read: Callable[[], dict | float]) -> None:
+        self._gauges[name] = read
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = [
+                {
+                    "method": method,
+                    "route": route,
+                    "requests": stats.latency_ms.count,
+                    "statuses": dict(stats.statuses),
+                    "latency_ms": {
+                        "sum": round(stats.latency_ms.total, 3),
+                        "p50": stats.latency_ms.quantile(0.5),
+                        "p99": stats.latency_ms.quantile(0.99),
+                        "buckets": dict(
+                            zip([*map(str, stats.latency_ms.buckets), "+Inf"], stats.latency_ms.counts)
+                        ),
+                    },
+                    "sql": {
+                        "statements": stats.sql_statements,
+                        "statements_per_request": round(stats.sql_statements / max(stats.latency_ms.count, 1), 3),
+                        "total_ms": round(stats.sql_ms, 3),
+                    },
+                    "phases_ms": {phase: round(value, 3) for phase, value in stats.phase_ms.items()},
+                }
+                for (method, route), stats in sorted(self._routes.items())
+            ]
+        return {"routes": routes, "gauges": {name: read() for name, read in self._gauges.items()}}
+
+
+registry = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.pop("query_started", None)
+    metrics = _current.get()
+    if metrics is not None and started is not None:
+        metrics.sql_count += 1
+        metrics.add("db", time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _server_timing(metrics: RequestMetrics, total_seconds: float) -> str:
+    entries = [f"app;dur={total_seconds * 1000:.2f}"]
+    for phase, seconds in sorted(metrics.phases.items()):
+        description = f';desc="{metrics.sql_count} queries"' if phase == "db" else ""
+        entries.append(f"{phase};dur={seconds * 1000:.2f}{description}")
+    return ", ".join(entries)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app: ASGIApp, *, server_timing: bool = True) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    # Headers leave before a streaming body does, so this is time-to-first-byte.
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", _server_timing(metrics, time.perf_counter() - metrics.started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            registry.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+                (time.perf_counter() - metrics.started) * 1000,
+                metrics,
+            )
@@ -0,0 +1,184 @@
+﻿import hashlib
+import threading
+import time
+import uuid
+from datetime import date
+from collections.abc import Awaitable, Callable
+from typing import Any, Protocol
+
+import orjson
+from fastapi import Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.metrics import timed
+
+PATIENTS_NAMESPACE = "patients"
+
+
+class CacheBackend(Protocol):
+    remote: bool
+    scope: str
+
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def generation(self, namespace: str) -> tuple[int, float]: ...
+
+    def bump(self, namespace: str) -> int: ...
+
+
+class MemoryCacheBackend:
+    remote = False
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        # Generations are per process, so ETags minted by another worker must never match here.
+        self.scope = uuid.uuid4().hex
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self._entries.set(key, value)
+
+    def generation(self, namespace: str) -> tuple[int, float]:
+        return self._generations.get(namespace, (0, 0.0))
+
+    def bump(self, namespace: str) -> int:
+        with self._lock:
+            generation = self._generations.get(namespace, (0, 0.0))[0] + 1
+            self._generations[namespace] = (generation, time.time())
+            return generation
+
+
+class RedisCacheBackend:
+    remote = True
+
+    def __init__(self, url: str, ttl: int, prefix: str = "rumahsakit") -> None:
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._ttl = ttl
+        self._prefix = prefix
+        self.scope = prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(f"{self._prefix}:cache:{key}")
+
+    def set(self, key: str, value: bytes) -> None:
+        self._client.set(f"{self._prefix}:cache:{key}", value, ex=self._ttl)
+
+    def generation(self, namespace: str) -> tuple[int, float]:
+        generation, bumped_at = self._client.mget(
+            f"{self._prefix}:generation:{namespace}", f"{self._prefix}:generation_at:{namespace}"
+        )
+        return int(generation or 0), float(bumped_at or 0)
+
+    def bump(self, namespace: str) -> int:
+        pipeline = self._client.pipeline()
+        pipeline.incr(f"{self._prefix}:generation:{namespace}")
+        pipeline.set(f"{self._prefix}:generation_at:{namespace}", time.time())
+        return int(pipeline.execute()[0])
+
+
+_backend: CacheBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend() -> CacheBackend | None:
+    global _backend
+    settings = get_settings()
+    if settings.response_cache_backend == "none":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.response_cache_backend == "redis":
+                    _backend = RedisCacheBackend(settings.response_cache_url, settings.response_cache_ttl)
+                else:
+                    _backend = MemoryCacheBackend(settings.response_cache_size, settings.response_cache_ttl)
+    return _backend
+
+
+def bump_generation(namespace: str = PATIENTS_NAMESPACE) -> None:
+    backend = get_cache_backend()
+    if backend is not None:
+        backend.bump(namespace)
+
+
+def _cache_key(request: Request) -> str:
+    params = sorted((key, value) for key, value in request.query_params.multi_items() if value != "")
+    raw = request.url.path + "?" + "&".join(f"{key}={value}" for key, value in params)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+def render_json(payload: BaseModel | dict) -> bytes:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump_json().encode("utf-8")
+    # Plain payloads are built from typed columns, so there is nothing left to validate.
+    return orjson.dumps(payload)
+
+
+def _replica_may_lag(bumped_at: float) -> bool:
+    settings = get_settings()
+    if not (settings.database_replica_url or settings.database_replica_async_url):
+        return False
+    return time.time() - bumped_at < settings.database_replica_max_lag
+
+
+async def cached_json(
+    request: Request,
+    build: Callable[[], Awaitable[Any]],
+    *,
+    namespace: str = PATIENTS_NAMESPACE,
+    media_type: str = "application/json",
+    render: Callable[[Any], bytes] = render_json,
+) -> Response:
+    backend = get_cache_backend()
+    if backend is None:
+        payload = await build()
+        with timed("serialize"):
+            body = render(payload)
+        return Response(body, media_type=media_type, headers={"Vary": "Accept"})
+
+    async def call(fn, *args):
+        return await run_in_threadpool(fn, *args) if backend.remote else fn(*args)
+
+    # The generation moves on every patient write, so a key/etag from before the write can never match again.
+    generation, bumped_at = await call(backend.generation, namespace)
+    if _replica_may_lag(bumped_at):
+        # A replica may not have the write yet; caching what it returns would pin that stale view to the new
+        # generation for the whole TTL, so serve it uncached and without a validator.
+        payload = await build()
+        with timed("serialize"):
+            body = render(payload)
+        return Response(body, media_type=media_type, headers={"Cache-Control": "no-store", "Vary": "Accept"})
+    # "today" feeds total_today, so responses also roll over at midnight.
+    key = f"{backend.scope}:{namespace}:{generation}:{date.today().isoformat()}:{media_type}:{_cache_key(request)}"
+    etag = f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = await call(backend.get, key)
+    if body is None:
+        payload = await build()
+        with timed("serialize"):
+            body = render(payload)
+        await call(backend.set, key, body)
+    return Response(body, media_type=media_type, headers=headers)
@@ -0,0 +1,73 @@
+﻿import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    def __init__(self, started: float) -> None:
+        self.started = started
+        self.ready_ms: float | None = None
+        self._phases_ms: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self._phases_ms[phase] = round(seconds * 1000, 3)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def mark_ready(self) -> None:
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        logger.info(
+            "Ready to serve after %.0f ms (%s)",
+            self.ready_ms,
+            ", ".join(f"{phase}={value:.0f}ms" for phase, value in self.snapshot()["phases_ms"].items()),
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"ready_ms": self.ready_ms, "phases_ms": dict(self._phases_ms)}
+
+
+def warm_jwks() -> None:
+    from app.auth.auth0 import get_token_verifier
+
+    get_token_verifier().warm()
+
+
+def warm_pool(engines: Iterable[Engine], connections: int) -> None:
+    for engine in engines:
+        # Check out several connections at once so the pool holds that many open ones afterwards.
+        held = []
+        try:
+            for _ in range(connections):
+                held.append(engine.connect())
+        finally:
+            for connection in held:
+                connection.close()
+
+
+async def warm_up(timings: StartupTimings, steps: dict[str, Callable[[], None]]) -> None:
+    # Runs after the server accepts traffic: a slow or unreachable Auth0 must not hold up the boot.
+    async def run(name: str, step: Callable[[], None]) -> None:
+        with timings.phase(name):
+            try:
+                await run_in_threadpool(step)
+            except Exception:
+                logger.warning("Startup warm-up step %s failed", name, exc_info=True)
+
+    await asyncio.gather(*(run(name, step) for name, step in steps.items()))
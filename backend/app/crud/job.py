@@ -0,0 +1,54 @@
+﻿import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models.job import Job, JobKind, JobStatus
+
+
+def create_job(db: Session, kind: JobKind, *, params: dict, created_by: int | None) -> Job:
+    job = Job(id=uuid.uuid4().hex, kind=kind, status=JobStatus.QUEUED, params=params, created_by=created_by)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Job | None:
+    return db.get(Job, job_id)
+
+
+def mark_running(db: Session, job_id: str) -> None:
+    db.execute(
+        update(Job).where(Job.id == job_id).values(status=JobStatus.RUNNING, started_at=datetime.now(timezone.utc))
+    )
+    db.commit()
+
+
+def set_progress(db: Session, job_id: str, progress: int) -> None:
+    db.execute(update(Job).where(Job.id == job_id).values(progress=progress))
+    db.commit()
+
+
+def mark_finished(
+    db: Session,
+    job_id: str,
+    *,
+    status: JobStatus,
+    result: dict | None = None,
+    error: str | None = None,
+    file_path: str | None = None,
+) -> None:
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(
+            status=status,
+            result=result,
+            error=error,
+            file_path=file_path,
+            finished_at=datetime.now(timezone.utc),
+        )
+    )
+    db.commit()
@@ -1,60 +1,258 @@
-﻿from datetime import date
-from typing import Iterable, Sequence
+﻿import base64
+import hashlib
+import json
+import re
+from collections import Counter
+from datetime import date
+from typing import Iterable, Iterator, Literal, Sequence
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import column, delete, func, insert, literal_column, or_, select, table, text, tuple_, update
+from sqlalchemy.orm import Query, Session
 
-from app.models.patient import Patient
+from app.core import events
+from app.core.response_cache import bump_generation
+from app.crud import patient_stats
+from app.models.patient import SEARCH_DOCUMENT_SQL, Patient
 from app.schemas.patient import PatientCreate, PatientUpdate
 
 
 def create_patient(db: Session, patient_in: PatientCreate) -> Patient:
     patient = Patient(**patient_in.model_dump())
     db.add(patient)
+    db.flush()
+    patient_stats.apply_deltas(db, {patient_stats.stat_key(patient): 1})
+    events.record(db, {"op": "created", "patient": _patient_dict(patient)})
     db.commit()
+    bump_generation()
     db.refresh(patient)
     return patient
 
 
-def bulk_create_patients(db: Session, patients_in: Iterable[PatientCreate]) -> Sequence[Patient]:
-    patients = [Patient(**patient.model_dump()) for patient in patients_in]
-    db.add_all(patients)
+IMPORT_COLUMNS = ("name", "tanggal_lahir", "tanggal_kunjungan", "diagnosis", "tindakan", "dokter")
+
+
+def _copy_patients(db: Session, rows: Sequence[dict]) -> None:
+    # Synced rows carry source_system/external_id/content_hash on top of IMPORT_COLUMNS.
+    columns = tuple(rows[0])
+    driver_connection = db.connection().connection.driver_connection
+    with driver_connection.cursor() as cursor:
+        with cursor.copy(f"COPY patients ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(tuple(row[column] for column in columns))
+
+
+def _insert_rows(db: Session, rows: Sequence[dict], *, use_copy: bool) -> None:
+    bind = db.get_bind()
+    if use_copy and bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg" and not bind.dialect.is_async:
+        _copy_patients(db, rows)
+    else:
+        # Core executemany: no ORM identity tracking and no per-row refresh.
+        db.execute(insert(Patient), list(rows))
+
+
+def bulk_insert_patients(db: Session, rows: Sequence[dict], *, use_copy: bool = True) -> int:
+    if not rows:
+        return 0
+    _insert_rows(db, rows, use_copy=use_copy)
+    patient_stats.apply_deltas(db, patient_stats.count_keys(rows))
+    events.record(db, {"op": "imported", "count": len(rows)})
+    db.commit()
+    bump_generation()
+    return len(rows)
+
+
+def content_hash(row: dict) -> str:
+    values = [row[column] for column in IMPORT_COLUMNS]
+    return hashlib.sha256(json.dumps(values, default=str, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def sync_patients(db: Session, source_system: str, rows: Sequence[dict], *, use_copy: bool = True) -> tuple[int, int, int]:
+    """Insert new, update changed and skip unchanged rows; returns (inserted, updated, unchanged)."""
+    # Within one batch the last occurrence of an external id wins, as if rows were applied in order.
+    incoming = {row["external_id"]: {**row, "source_system": source_system, "content_hash": content_hash(row)} for row in rows}
+    if not incoming:
+        return 0, 0, 0
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Serialises concurrent syncs of the same source so both cannot insert the same external id.
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(source_system))))
+    existing = {
+        row.external_id: row
+        for row in db.execute(
+            select(Patient.id, Patient.external_id, Patient.content_hash, *_STAT_COLUMNS).where(
+                Patient.source_system == source_system,
+                Patient.external_id.in_(list(incoming)),
+            )
+        )
+    }
+
+    inserts: list[dict] = []
+    updates: list[dict] = []
+    deltas: Counter = Counter()
+    unchanged = 0
+    for external_id, row in incoming.items():
+        current = existing.get(external_id)
+        if current is None:
+            inserts.append(row)
+            deltas[patient_stats.stat_key(row)] += 1
+        elif current.content_hash == row["content_hash"]:
+            unchanged += 1
+        else:
+            updates.append({**row, "id": current.id})
+            deltas[patient_stats.stat_key(current)] -= 1
+            deltas[patient_stats.stat_key(row)] += 1
+
+    if inserts:
+        _insert_rows(db, inserts, use_copy=use_copy)
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany for the whole batch.
+        db.execute(update(Patient), updates)
+    patient_stats.apply_deltas(db, deltas)
+    if inserts or updates:
+        events.record(db, {"op": "imported", "count": len(inserts) + len(updates)})
     db.commit()
-    for patient in patients:
-        db.refresh(patient)
-    return patients
+    if inserts or updates:
+        bump_generation()
+    return len(inserts), len(updates), unchanged
+
+
+def bulk_create_patients(db: Session, patients_in: Iterable[PatientCreate]) -> int:
+    return bulk_insert_patients(db, [patient.model_dump() for patient in patients_in])
 
 
 def get_patient(db: Session, patient_id: int) -> Patient | None:
     return db.query(Patient).filter(Patient.id == patient_id).first()
 
 
-def delete_patient(db: Session, patient: Patient) -> None:
-    db.delete(patient)
+CountMode = Literal["exact", "estimated", "none"]
+
+# List endpoints read plain column tuples: no identity map, no per-row ORM state, and rows
+# can be handed straight to the JSON encoder.
+PATIENT_COLUMNS = (
+    Patient.id,
+    Patient.name,
+    Patient.tanggal_lahir,
+    Patient.tanggal_kunjungan,
+    Patient.diagnosis,
+    Patient.tindakan,
+    Patient.dokter,
+)
+
+
+def _patient_dict(patient) -> dict:
+    return {column.key: getattr(patient, column.key) for column in PATIENT_COLUMNS}
+
+# Statements below return what they touched, so the rollup is maintained without re-reading rows.
+_NO_SYNC = {"synchronize_session": False}
+_STAT_COLUMNS = (Patient.tanggal_kunjungan, Patient.dokter, Patient.diagnosis)
+
+
+def delete_patient(db: Session, patient_id: int) -> bool:
+    row = db.execute(
+        delete(Patient).where(Patient.id == patient_id).returning(*_STAT_COLUMNS),
+        execution_options=_NO_SYNC,
+    ).first()
+    if row is None:
+        db.rollback()
+        return False
+    patient_stats.apply_deltas(db, {tuple(row): -1})
+    events.record(db, {"op": "deleted", "ids": [patient_id]})
     db.commit()
+    bump_generation()
+    return True
 
 
-def update_patient(db: Session, patient: Patient, updates: PatientUpdate) -> Patient:
-    update_data = updates.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(patient, field, value)
-    db.add(patient)
+def update_patient(db: Session, patient_id: int, updates: PatientUpdate):
+    values = updates.model_dump(exclude_unset=True)
+    if not values:
+        return db.execute(select(*PATIENT_COLUMNS).where(Patient.id == patient_id)).first()
+
+    old_key = None
+    stmt = update(Patient).values(**values)
+    if {"tanggal_kunjungan", "dokter", "diagnosis"}.isdisjoint(values):
+        row = db.execute(
+            stmt.where(Patient.id == patient_id).returning(*PATIENT_COLUMNS), execution_options=_NO_SYNC
+        ).first()
+    elif db.get_bind().dialect.name == "postgresql":
+        # Join the row to a locked snapshot of itself so the pre-update stat key comes back in the same statement.
+        old = select(Patient.id, *_STAT_COLUMNS).where(Patient.id == patient_id).with_for_update().subquery("old")
+        row = db.execute(
+            stmt.where(Patient.id == old.c.id).returning(
+                *PATIENT_COLUMNS,
+                old.c.tanggal_kunjungan.label("old_tanggal_kunjungan"),
+                old.c.dokter.label("old_dokter"),
+                old.c.diagnosis.label("old_diagnosis"),
+            ),
+            execution_options=_NO_SYNC,
+        ).first()
+        if row is not None:
+            old_key = (row.old_tanggal_kunjungan, row.old_dokter, row.old_diagnosis)
+    else:
+        # SQLite's RETURNING cannot see joined tables; an embedded database pays no network hop for the read.
+        old_key = db.execute(select(*_STAT_COLUMNS).where(Patient.id == patient_id)).first()
+        row = db.execute(
+            stmt.where(Patient.id == patient_id).returning(*PATIENT_COLUMNS), execution_options=_NO_SYNC
+        ).first()
+
+    if row is None:
+        db.rollback()
+        return None
+    if old_key is not None:
+        new_key = patient_stats.stat_key(row)
+        if new_key != tuple(old_key):
+            patient_stats.apply_deltas(db, {tuple(old_key): -1, new_key: 1})
+    events.record(db, {"op": "updated", "patient": _patient_dict(row)})
     db.commit()
-    db.refresh(patient)
-    return patient
+    bump_generation()
+    return row
 
 
-def list_patients(
+def reassign_dokter(
     db: Session,
     *,
-    skip: int = 0,
-    limit: int = 100,
-    name: str | None = None,
+    from_dokter: str,
+    to_dokter: str,
     start_date: date | None = None,
     end_date: date | None = None,
-):
-    query = db.query(Patient)
+) -> int:
+    stmt = update(Patient).where(Patient.dokter == from_dokter).values(dokter=to_dokter)
+    if start_date:
+        stmt = stmt.where(Patient.tanggal_kunjungan >= start_date)
+    if end_date:
+        stmt = stmt.where(Patient.tanggal_kunjungan <= end_date)
+    rows = db.execute(
+        stmt.returning(Patient.id, Patient.tanggal_kunjungan, Patient.diagnosis), execution_options=_NO_SYNC
+    ).all()
+
+    deltas: Counter = Counter()
+    for _, visit_date, diagnosis in rows:
+        deltas[(visit_date, from_dokter, diagnosis)] -= 1
+        deltas[(visit_date, to_dokter, diagnosis)] += 1
+    patient_stats.apply_deltas(db, deltas)
+    if rows:
+        events.record(db, events.ids_payload("reassigned", [row[0] for row in rows], dokter=to_dokter))
+    db.commit()
+    if rows:
+        bump_generation()
+    return len(rows)
+
 
+def delete_patients(db: Session, patient_ids: Sequence[int]) -> list[int]:
+    rows = db.execute(
+        delete(Patient).where(Patient.id.in_(patient_ids)).returning(Patient.id, *_STAT_COLUMNS),
+        execution_options=_NO_SYNC,
+    ).all()
+    deltas = Counter(tuple(row[1:]) for row in rows)
+    patient_stats.apply_deltas(db, {key: -count for key, count in deltas.items()})
+    if rows:
+        events.record(db, events.ids_payload("deleted", [row[0] for row in rows]))
+    db.commit()
+    if rows:
+        bump_generation()
+    return [row[0] for row in rows]
+
+
+def _apply_filters(query, *, name: str | None, start_date: date | None, end_date: date | None):
     if name:
         like_pattern = f"%{name}%"
         query = query.filter(Patient.name.ilike(like_pattern))
@@ -62,10 +260,64 @@ def list_patients(
         query = query.filter(Patient.tanggal_kunjungan >= start_date)
     if end_date:
         query = query.filter(Patient.tanggal_kunjungan <= end_date)
+    return query
+
+
+def encode_cursor(patient: Patient) -> str:
+    raw = json.dumps([patient.tanggal_kunjungan.isoformat(), patient.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        visit_date, patient_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return date.fromisoformat(visit_date), int(patient_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _estimate_count(db: Session, query: Query) -> int:
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return query.count()
+    compiled = query.statement.compile(dialect=bind.dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def list_patients(
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    name: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    cursor: tuple[date, int] | None = None,
+    count: CountMode = "exact",
+):
+    query = _apply_filters(db.query(Patient), name=name, start_date=start_date, end_date=end_date)
+
+    if count == "exact":
+        total = query.count()
+    elif count == "estimated":
+        total = _estimate_count(db, query)
+    else:
+        total = None
+
+    if cursor is not None:
+        # Seek past the last row of the previous page instead of scanning OFFSET rows.
+        # The plain date bound is redundant but lets PostgreSQL prune partitions and use the index range.
+        query = query.filter(
+            Patient.tanggal_kunjungan <= cursor[0],
+            tuple_(Patient.tanggal_kunjungan, Patient.id) < tuple_(*cursor),
+        )
+        skip = 0
 
-    total = query.count()
     items = (
-        query.order_by(Patient.tanggal_kunjungan.desc(), Patient.id.desc())
+        query.with_entities(*PATIENT_COLUMNS)
+        .order_by(Patient.tanggal_kunjungan.desc(), Patient.id.desc())
         .offset(skip)
         .limit(limit)
         .all()
@@ -73,15 +325,145 @@ def list_patients(
     return items, total
 
 
-def get_summary(db: Session, *, start_date: date | None = None, end_date: date | None = None) -> dict[str, int]:
+_patients_fts = table("patients_fts", column("rowid"))
+
+
+def search_terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q.lower())
+
+
+def _search_query(db: Session, terms: list[str]) -> Query:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        document = literal_column(f"({SEARCH_DOCUMENT_SQL})")
+        tsquery = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        return (
+            db.query(Patient)
+            .filter(document.op("@@")(tsquery))
+            .order_by(func.ts_rank(document, tsquery).desc())
+        )
+    if dialect == "sqlite":
+        return (
+            db.query(Patient)
+            .join(_patients_fts, _patients_fts.c.rowid == Patient.id)
+            .filter(text("patients_fts MATCH :match").bindparams(match=" ".join(f'"{term}"*' for term in terms)))
+            .order_by(text("bm25(patients_fts, 10.0, 5.0, 2.0, 1.0)"))
+        )
     query = db.query(Patient)
-    if start_date:
-        query = query.filter(Patient.tanggal_kunjungan >= start_date)
-    if end_date:
-        query = query.filter(Patient.tanggal_kunjungan <= end_date)
-    total = query.count()
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(
+            or_(
+                Patient.name.ilike(pattern),
+                Patient.diagnosis.ilike(pattern),
+                Patient.tindakan.ilike(pattern),
+                Patient.dokter.ilike(pattern),
+            )
+        )
+    return query
+
+
+def search_patients(
+    db: Session,
+    q: str,
+    *,
+    skip: int = 0,
+    limit: int = 50,
+    count: CountMode = "exact",
+):
+    terms = search_terms(q)
+    if not terms:
+        return [], 0 if count != "none" else None
+
+    query = _search_query(db, terms)
+    if count == "exact":
+        total = query.order_by(None).count()
+    elif count == "estimated":
+        total = _estimate_count(db, query.order_by(None))
+    else:
+        total = None
+
+    items = (
+        query.with_entities(*PATIENT_COLUMNS)
+        .order_by(Patient.tanggal_kunjungan.desc(), Patient.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return items, total
+
+
+def iter_patient_rows(
+    db: Session,
+    *,
+    name: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    batch_size: int = 1000,
+) -> Iterator[tuple]:
+    stmt = _apply_filters(
+        select(
+            Patient.id,
+            Patient.name,
+            Patient.tanggal_lahir,
+            Patient.tanggal_kunjungan,
+            Patient.diagnosis,
+            Patient.tindakan,
+            Patient.dokter,
+        ),
+        name=name,
+        start_date=start_date,
+        end_date=end_date,
+    ).order_by(Patient.tanggal_kunjungan.desc(), Patient.id.desc())
+    # yield_per switches to a server-side cursor, so rows arrive batch by batch.
+    yield from db.execute(stmt.execution_options(yield_per=batch_size))
+
+
+def _ranked(counts: dict[str, int]) -> list[dict]:
+    return [
+        {"label": label, "count": value}
+        for label, value in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+def fold_summary(rows: Iterable[tuple[date, str, str, int]], today: date) -> dict:
+    total = total_today = 0
+    by_day: dict[date, int] = {}
+    by_doctor: dict[str, int] = {}
+    by_diagnosis: dict[str, int] = {}
+    for visit_date, dokter, diagnosis, visits in rows:
+        total += visits
+        if visit_date == today:
+            total_today += visits
+        by_day[visit_date] = by_day.get(visit_date, 0) + visits
+        by_doctor[dokter] = by_doctor.get(dokter, 0) + visits
+        by_diagnosis[diagnosis] = by_diagnosis.get(diagnosis, 0) + visits
+
+    return {
+        "total_patients": total,
+        "total_today": total_today,
+        "by_day": [{"date": day, "count": by_day[day]} for day in sorted(by_day)],
+        "by_doctor": _ranked(by_doctor),
+        "by_diagnosis": _ranked(by_diagnosis),
+    }
+
+
+def get_summary(
+    db: Session,
+    *,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    name: str | None = None,
+) -> dict:
+    if not name:
+        rows = patient_stats.summary_rows(db, start_date=start_date, end_date=end_date)
+        return fold_summary(rows, date.today())
 
-    today = date.today()
-    today_query = query.filter(Patient.tanggal_kunjungan == today)
-    total_today = today_query.count()
-    return {"total_patients": total, "total_today": total_today}
+    # One grouped scan; every breakdown (and today's total) is folded from the same rows.
+    stmt = _apply_filters(
+        select(Patient.tanggal_kunjungan, Patient.dokter, Patient.diagnosis, func.count()),
+        name=name,
+        start_date=start_date,
+        end_date=end_date,
+    ).group_by(Patient.tanggal_kunjungan, Patient.dokter, Patient.diagnosis)
+    return fold_summary(db.execute(stmt).all(), date.today())
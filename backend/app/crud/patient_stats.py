@@ -0,0 +1,105 @@
+﻿from collections import Counter
+from collections.abc import Iterable, Mapping
+from datetime import date
+
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.response_cache import bump_generation
+from app.models.patient import Patient
+from app.models.patient_stats import PatientDailyStat
+
+StatKey = tuple[date, str, str]
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def stat_key(values) -> StatKey:
+    if isinstance(values, Mapping):
+        return values["tanggal_kunjungan"], values["dokter"], values["diagnosis"]
+    return values.tanggal_kunjungan, values.dokter, values.diagnosis
+
+
+def count_keys(rows: Iterable) -> Counter:
+    return Counter(stat_key(row) for row in rows)
+
+
+def apply_deltas(db: Session, deltas: Mapping[StatKey, int]) -> None:
+    rows = [
+        {"visit_date": visit_date, "dokter": dokter, "diagnosis": diagnosis, "visit_count": delta}
+        for (visit_date, dokter, diagnosis), delta in deltas.items()
+        if delta
+    ]
+    if not rows:
+        return
+
+    dialect_insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(PatientDailyStat)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PatientDailyStat.visit_date, PatientDailyStat.dokter, PatientDailyStat.diagnosis],
+            set_={"visit_count": PatientDailyStat.visit_count + stmt.excluded.visit_count},
+        )
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            stat = db.get(PatientDailyStat, (row["visit_date"], row["dokter"], row["diagnosis"]))
+            if stat is None:
+                db.add(PatientDailyStat(**row))
+            else:
+                stat.visit_count += row["visit_count"]
+        db.flush()
+
+    emptied = [key for key, delta in deltas.items() if delta < 0]
+    if emptied:
+        db.execute(
+            delete(PatientDailyStat).where(
+                tuple_(PatientDailyStat.visit_date, PatientDailyStat.dokter, PatientDailyStat.diagnosis).in_(emptied),
+                PatientDailyStat.visit_count <= 0,
+            )
+        )
+
+
+def summary_rows(db: Session, *, start_date: date | None = None, end_date: date | None = None):
+    stmt = select(
+        PatientDailyStat.visit_date,
+        PatientDailyStat.dokter,
+        PatientDailyStat.diagnosis,
+        PatientDailyStat.visit_count,
+    )
+    if start_date:
+        stmt = stmt.where(PatientDailyStat.visit_date >= start_date)
+    if end_date:
+        stmt = stmt.where(PatientDailyStat.visit_date <= end_date)
+    return db.execute(stmt).all()
+
+
+def rebuild(db: Session, *, start_date: date | None = None, end_date: date | None = None) -> int:
+    if db.get_bind().dialect.name == "postgresql":
+        # Writers block on the rollup until the rebuild commits, so no increment is lost or doubled.
+        db.connection().exec_driver_sql("LOCK TABLE patient_daily_stats IN EXCLUSIVE MODE")
+
+    cleared = delete(PatientDailyStat)
+    source = select(Patient.tanggal_kunjungan, Patient.dokter, Patient.diagnosis, func.count())
+    if start_date:
+        cleared = cleared.where(PatientDailyStat.visit_date >= start_date)
+        source = source.where(Patient.tanggal_kunjungan >= start_date)
+    if end_date:
+        cleared = cleared.where(PatientDailyStat.visit_date <= end_date)
+        source = source.where(Patient.tanggal_kunjungan <= end_date)
+    source = source.group_by(Patient.tanggal_kunjungan, Patient.dokter, Patient.diagnosis)
+
+    db.execute(cleared)
+    result = db.execute(
+        insert(PatientDailyStat).from_select(
+            ["visit_date", "dokter", "diagnosis", "visit_count"],
+            source,
+        )
+    )
+    db.commit()
+    bump_generation()
+    return result.rowcount
@@ -1,4 +1,5 @@
-﻿from sqlalchemy.orm import Session
+﻿from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 
 from app.models.user import User, UserRole
 from app.schemas.user import UserCreate
@@ -29,6 +30,12 @@ def update_user_role(db: Session, user: User, role: UserRole) -> User:
     return user
 
 
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
 def upsert_user(
     db: Session,
     *,
@@ -36,6 +43,28 @@ def upsert_user(
     email: str,
     full_name: str | None,
     role: UserRole,
+) -> User:
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        return _upsert_user_orm(db, auth0_id=auth0_id, email=email, full_name=full_name, role=role)
+
+    stmt = insert(User).values(auth0_id=auth0_id, email=email, full_name=full_name, role=role)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.auth0_id],
+        set_={"email": stmt.excluded.email, "full_name": stmt.excluded.full_name, "role": stmt.excluded.role},
+    ).returning(User)
+    user = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+    db.commit()
+    return user
+
+
+def _upsert_user_orm(
+    db: Session,
+    *,
+    auth0_id: str,
+    email: str,
+    full_name: str | None,
+    role: UserRole,
 ) -> User:
     user = get_user_by_auth0_id(db, auth0_id)
     if user is None:
@@ -49,9 +78,8 @@ def upsert_user(
             ),
         )
 
-    if user.role != role:
-        user = update_user_role(db, user, role)
-    if user.email != email or user.full_name != full_name:
+    if user.role != role or user.email != email or user.full_name != full_name:
+        user.role = role
         user.email = email
         user.full_name = full_name
         db.add(user)
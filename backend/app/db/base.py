@@ -1,3 +1,5 @@
 ﻿from app.db.session import Base  # noqa: F401
+from app.models.job import Job  # noqa: F401
 from app.models.patient import Patient  # noqa: F401
+from app.models.patient_stats import PatientDailyStat  # noqa: F401
 from app.models.user import User  # noqa: F401
@@ -0,0 +1,156 @@
+﻿import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, inspect, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migrations_metadata,
+    Column("version", String(64), primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: str
+    description: str
+    upgrade: Callable[[Connection], None]
+    transactional: bool = True
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: str, description: str, *, transactional: bool = True):
+    def decorator(upgrade: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        MIGRATIONS.append(Migration(version, description, upgrade, transactional))
+        return upgrade
+
+    return decorator
+
+
+@migration("0000", "Baseline schema")
+def _baseline(conn: Connection) -> None:
+    from app.db.base import Base
+
+    Base.metadata.create_all(bind=conn)
+
+
+@migration("0001", "Visit-date and name search indexes on patients", transactional=False)
+def _patient_indexes(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        # CONCURRENTLY keeps clinical writes flowing while large tables are indexed.
+        conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conn.exec_driver_sql(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_tanggal_kunjungan_id "
+            "ON patients (tanggal_kunjungan, id)"
+        )
+        conn.exec_driver_sql(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_name_trgm "
+            "ON patients USING gin (name gin_trgm_ops)"
+        )
+    else:
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_patients_tanggal_kunjungan_id ON patients (tanggal_kunjungan, id)"
+        )
+
+
+@migration("0002", "Daily visit rollup table")
+def _patient_daily_stats(conn: Connection) -> None:
+    from sqlalchemy.orm import Session
+
+    from app.crud import patient_stats
+    from app.models.patient_stats import PatientDailyStat
+
+    PatientDailyStat.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+        patient_stats.rebuild(db)
+
+
+@migration("0003", "Full-text search over name, diagnosis, tindakan and dokter", transactional=False)
+def _patient_search(conn: Connection) -> None:
+    from app.models.patient import SEARCH_DOCUMENT_SQL, SQLITE_SEARCH_DDL
+
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_search ON patients USING gin (({SEARCH_DOCUMENT_SQL}))"
+        )
+    elif conn.dialect.name == "sqlite":
+        for statement in SQLITE_SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+        # Index the rows that existed before the triggers did.
+        conn.exec_driver_sql("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')")
+
+
+@migration("0004", "Background jobs table")
+def _jobs(conn: Connection) -> None:
+    from app.models.job import Job
+
+    Job.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration("0005", "Source system, external id and content hash for idempotent imports", transactional=False)
+def _patient_sync_columns(conn: Connection) -> None:
+    from app.db.partitioning import is_partitioned
+
+    existing = {column["name"] for column in inspect(conn).get_columns("patients")}
+    for name, ddl in (
+        ("source_system", "VARCHAR(64)"),
+        ("external_id", "VARCHAR(128)"),
+        ("content_hash", "VARCHAR(64)"),
+    ):
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE patients ADD COLUMN {name} {ddl}")
+
+    # CONCURRENTLY is not available on a partitioned parent; there each partition is indexed in turn.
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" and not is_partitioned(conn) else ""
+    conn.exec_driver_sql(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS ix_patients_source_external ON patients (source_system, external_id)"
+    )
+
+
+@migration("0006", "Drop the btree name index that substring filters cannot use")
+def _drop_name_btree(conn: Connection) -> None:
+    # `name ILIKE '%...%'` never uses a btree, so it only slowed writes; PostgreSQL has the trigram index instead.
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_patients_name")
+
+
+def applied_versions(engine: Engine) -> set[str]:
+    # One query on an up-to-date database; table reflection only happens on the very first boot.
+    try:
+        with engine.connect() as conn:
+            return set(conn.execute(select(schema_migrations.c.version)).scalars())
+    except DBAPIError:
+        migrations_metadata.create_all(bind=engine)
+        return set()
+
+
+def pending_migrations(engine: Engine) -> list[Migration]:
+    applied = applied_versions(engine)
+    return [item for item in sorted(MIGRATIONS, key=lambda m: m.version) if item.version not in applied]
+
+
+def apply_migrations(engine: Engine) -> list[str]:
+    applied: list[str] = []
+    for item in pending_migrations(engine):
+        logger.info("Applying migration %s: %s", item.version, item.description)
+        if item.transactional:
+            with engine.begin() as conn:
+                item.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(version=item.version, description=item.description))
+        else:
+            with engine.connect() as conn:
+                item.upgrade(conn.execution_options(isolation_level="AUTOCOMMIT"))
+            with engine.begin() as conn:
+                conn.execute(schema_migrations.insert().values(version=item.version, description=item.description))
+        applied.append(item.version)
+    return applied
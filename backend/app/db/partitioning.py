@@ -0,0 +1,196 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Literal
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+Interval = Literal["month", "year"]
+
+PARENT = "patients"
+DEFAULT_PARTITION = "patients_default"
+_PARTITION_NAME = re.compile(r"^patients_p(\d{4})(\d{2})?$")
+# Arbitrary constant shared by every worker so only one of them maintains partitions at a time.
+_ADVISORY_LOCK_KEY = 7_100_016
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    start: date
+    end: date
+
+
+def period_start(day: date, interval: Interval) -> date:
+    return date(day.year, 1, 1) if interval == "year" else date(day.year, day.month, 1)
+
+
+def shift(start: date, interval: Interval, periods: int) -> date:
+    if interval == "year":
+        return date(start.year + periods, 1, 1)
+    months = start.year * 12 + start.month - 1 + periods
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_for(day: date, interval: Interval) -> Partition:
+    start = period_start(day, interval)
+    suffix = f"{start.year:04d}" if interval == "year" else f"{start.year:04d}{start.month:02d}"
+    return Partition(f"patients_p{suffix}", start, shift(start, interval, 1))
+
+
+def parse_partition(name: str) -> Partition | None:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    year, month = int(match.group(1)), match.group(2)
+    if month is None:
+        return partition_for(date(year, 1, 1), "year")
+    return partition_for(date(year, int(month), 1), "month")
+
+
+def _bounds(partition: Partition) -> str:
+    # DDL cannot take bind parameters; the bounds are dates we computed, never user input.
+    return f"FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT}).scalar()
+    return kind == "p"
+
+
+def list_partitions(conn: Connection) -> list[Partition]:
+    names = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(:name)"
+        ),
+        {"name": PARENT},
+    ).scalars()
+    return sorted((partition for partition in map(parse_partition, names) if partition), key=lambda p: p.start)
+
+
+def _create_partition(conn: Connection, partition: Partition) -> None:
+    # Rows that landed in the default partition before this range existed must move first, or ATTACH fails.
+    conn.exec_driver_sql(f"CREATE TABLE {partition.name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE tanggal_kunjungan >= :start AND tanggal_kunjungan < :end RETURNING *) "
+            f"INSERT INTO {partition.name} SELECT * FROM moved"
+        ),
+        {"start": partition.start, "end": partition.end},
+    )
+    conn.exec_driver_sql(f"ALTER TABLE {PARENT} ATTACH PARTITION {partition.name} FOR VALUES {_bounds(partition)}")
+    logger.info("Created partition %s [%s, %s)", partition.name, partition.start, partition.end)
+
+
+def ensure_partitions(conn: Connection, *, interval: Interval, ahead: int, today: date | None = None) -> list[str]:
+    existing = {partition.name for partition in list_partitions(conn)}
+    current = period_start(today or date.today(), interval)
+    created = []
+    for offset in range(0, ahead + 1):
+        partition = partition_for(shift(current, interval, offset), interval)
+        if partition.name not in existing:
+            _create_partition(conn, partition)
+            created.append(partition.name)
+    return created
+
+
+def detach_expired(
+    conn: Connection,
+    *,
+    retention: int,
+    archive_schema: str,
+    interval: Interval,
+    today: date | None = None,
+) -> list[Partition]:
+    if retention <= 0:
+        return []
+    cutoff = shift(period_start(today or date.today(), interval), interval, -retention)
+    expired = [partition for partition in list_partitions(conn) if partition.end <= cutoff]
+    if expired:
+        conn.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"')
+    for partition in expired:
+        conn.exec_driver_sql(f"ALTER TABLE {PARENT} DETACH PARTITION {partition.name}")
+        conn.exec_driver_sql(f'ALTER TABLE {partition.name} SET SCHEMA "{archive_schema}"')
+        logger.info("Archived partition %s to schema %s", partition.name, archive_schema)
+    return expired
+
+
+def convert_to_partitioned(conn: Connection, *, interval: Interval) -> int:
+    from app.models.patient import Patient
+
+    conn.exec_driver_sql(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE")
+    conn.exec_driver_sql(
+        f"CREATE TABLE patients_partitioned (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (tanggal_kunjungan)"
+    )
+    # PostgreSQL requires the partition key in every unique constraint; ids still come from one sequence.
+    conn.exec_driver_sql("ALTER TABLE patients_partitioned ADD PRIMARY KEY (id, tanggal_kunjungan)")
+    conn.exec_driver_sql(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF patients_partitioned DEFAULT")
+
+    periods = conn.execute(
+        text(f"SELECT DISTINCT date_trunc(:interval, tanggal_kunjungan)::date FROM {PARENT}"),
+        {"interval": interval},
+    ).scalars()
+    for start in sorted(periods):
+        partition = partition_for(start, interval)
+        conn.exec_driver_sql(
+            f"CREATE TABLE {partition.name} PARTITION OF patients_partitioned FOR VALUES {_bounds(partition)}"
+        )
+
+    copied = conn.exec_driver_sql(f"INSERT INTO patients_partitioned SELECT * FROM {PARENT}").rowcount
+    conn.exec_driver_sql(f"ALTER SEQUENCE {PARENT}_id_seq OWNED BY NONE")
+    conn.exec_driver_sql(f"DROP TABLE {PARENT}")
+    conn.exec_driver_sql(f"ALTER TABLE patients_partitioned RENAME TO {PARENT}")
+    conn.exec_driver_sql(f"ALTER TABLE {PARENT} RENAME CONSTRAINT patients_partitioned_pkey TO {PARENT}_pkey")
+    conn.exec_driver_sql(f"ALTER SEQUENCE {PARENT}_id_seq OWNED BY {PARENT}.id")
+    for index in Patient.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    return copied
+
+
+def maintain(engine: Engine, *, convert: bool = False) -> dict:
+    from app.core.config import get_settings
+
+    settings = get_settings()
+    report: dict = {"converted": None, "created": [], "archived": []}
+    if engine.dialect.name != "postgresql":
+        logger.warning("Partitioning is only supported on PostgreSQL; skipping")
+        return report
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        if not is_partitioned(conn):
+            if not convert:
+                logger.warning("patients is not partitioned yet; run `python -m app.manage partitions --convert`")
+                return report
+            report["converted"] = convert_to_partitioned(conn, interval=settings.patients_partition_interval)
+        report["created"] = ensure_partitions(
+            conn,
+            interval=settings.patients_partition_interval,
+            ahead=settings.patients_partitions_ahead,
+        )
+        expired = detach_expired(
+            conn,
+            retention=settings.patients_partition_retention,
+            archive_schema=settings.patients_partition_archive_schema,
+            interval=settings.patients_partition_interval,
+        )
+        report["archived"] = [partition.name for partition in expired]
+
+    if expired:
+        from app.crud import patient_stats
+        from app.db.session import SessionLocal
+
+        # Archived visits leave the live table, so drop them from the rollup as well.
+        with SessionLocal() as db:
+            patient_stats.rebuild(db, end_date=expired[-1].end - timedelta(days=1))
+    return report
@@ -1,22 +1,136 @@
-﻿from collections.abc import Generator
+﻿from collections.abc import AsyncGenerator, AsyncIterator, Callable, Generator
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
 
-from sqlalchemy import create_engine
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from app.core.config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url, future=True, pool_pre_ping=True)
+
+def _engine_options(url: str) -> dict[str, Any]:
+    options: dict[str, Any] = {"pool_pre_ping": True}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_recycle=settings.db_pool_recycle,
+            pool_timeout=settings.db_pool_timeout,
+        )
+    return options
+
+
+engine = create_engine(settings.database_url, future=True, **_engine_options(settings.database_url))
+
+replica_engine = (
+    create_engine(settings.database_replica_url, future=True, **_engine_options(settings.database_replica_url))
+    if settings.database_replica_url
+    else engine
+)
+
+
+def _sqlite_wal(dbapi_connection, connection_record) -> None:
+    # Background jobs write progress while exports read; WAL lets a writer and readers overlap.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+for _engine in {engine, replica_engine}:
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine, "connect", _sqlite_wal)
+
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
+ReadSessionLocal = sessionmaker(bind=replica_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+
+def _async_engine(url: str | None):
+    return create_async_engine(url, **_engine_options(url)) if url else None
+
+
+async_engine = _async_engine(settings.database_async_url or settings.database_url) if settings.database_async else None
+
+async_replica_engine = (
+    (_async_engine(settings.database_replica_async_url or settings.database_replica_url) or async_engine)
+    if settings.database_async
+    else None
+)
+
+AsyncSessionLocal = (
+    async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None
+    else None
+)
+
+AsyncReadSessionLocal = (
+    async_sessionmaker(bind=async_replica_engine, autoflush=False, expire_on_commit=False)
+    if async_replica_engine is not None
+    else None
+)
+
 Base = declarative_base()
 
+T = TypeVar("T")
+
+
+class Database:
+    def __init__(self, session: Session | AsyncSession) -> None:
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # The CRUD layer is written once against Session. In async mode it runs on the
+        # async connection via run_sync; otherwise it runs in the threadpool. Either way
+        # the event loop is never blocked by a query.
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        db.close()
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def _open_database(
+    sync_factory: sessionmaker,
+    async_factory: async_sessionmaker | None,
+) -> AsyncIterator[Database]:
+    if async_factory is not None:
+        async with async_factory() as session:
+            yield Database(session)
+        return
+
+    db = sync_factory()
+    try:
+        yield Database(db)
+    finally:
+        await run_in_threadpool(db.close)
+
+
+async def get_database() -> AsyncGenerator[Database, None]:
+    async with _open_database(SessionLocal, AsyncSessionLocal) as database:
+        yield database
+
+
+async def get_read_database() -> AsyncGenerator[Database, None]:
+    # Read-only routes go to the replica when one is configured; writes always stay on the primary.
+    async with _open_database(ReadSessionLocal, AsyncReadSessionLocal) as database:
+        yield database
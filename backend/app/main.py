@@ -1,15 +1,68 @@
-﻿from fastapi import FastAPI
+﻿import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from functools import partial
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api.routes import api_router
+from app.core import events
+from app.core.admission import AdmissionMiddleware, create_limiters
+from app.core.compression import CompressionMiddleware
 from app.core.config import get_settings
 from app.db import base  
-from app.db.session import Base, engine
+from app.core.metrics import InstrumentationMiddleware, TimedJSONResponse, instrument_engine, registry
+from app.core.startup import StartupTimings, warm_jwks, warm_pool, warm_up
+from app.db import partitioning
+from app.db.migrations import apply_migrations
+from app.db.session import async_engine, async_replica_engine, engine, replica_engine
+from app.services.jobs import shutdown_job_runner
+
+logger = logging.getLogger(__name__)
+
+_import_seconds = time.perf_counter() - _import_started
+
+
+async def _maintain_partitions_periodically(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(partitioning.maintain, engine)
+        except Exception:
+            logger.exception("Partition maintenance failed")
 
 
 def create_app() -> FastAPI:
+    created = time.perf_counter()
     settings = get_settings()
-    application = FastAPI(title="Rumah Sakit API", version="1.0.0")
+    timings = StartupTimings(started=_import_started)
+    timings.record("imports", _import_seconds)
+    application = FastAPI(
+        title="Rumah Sakit API",
+        version="1.0.0",
+        default_response_class=TimedJSONResponse if settings.metrics_enabled else JSONResponse,
+    )
+
+    limiters = create_limiters(
+        settings.admission_concurrency if settings.admission_control else {},
+        settings.admission_per_user,
+        queue_size=settings.admission_queue_size,
+        queue_timeout=settings.admission_queue_timeout,
+    )
+    if limiters:
+        # Innermost, so CORS headers and metrics still wrap the 429/503 it answers with.
+        application.add_middleware(
+            AdmissionMiddleware,
+            routes=application.router.routes,
+            limiters=limiters,
+            retry_after=settings.admission_retry_after,
+        )
 
     application.add_middleware(
         CORSMiddleware,
@@ -19,9 +72,56 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    if settings.metrics_enabled:
+        for instrumented in {engine, replica_engine}:
+            instrument_engine(instrumented)
+        for instrumented in {async_engine, async_replica_engine} - {None}:
+            instrument_engine(instrumented.sync_engine)
+        application.add_middleware(InstrumentationMiddleware, server_timing=settings.metrics_server_timing)
+
+    if settings.compression_enabled:
+        application.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_minimum_size,
+            content_types=settings.compression_content_types,
+            gzip_level=settings.compression_gzip_level,
+            brotli_quality=settings.compression_brotli_quality,
+            brotli_enabled=settings.compression_brotli,
+        )
+
     @application.on_event("startup")
     def on_startup() -> None:
-        Base.metadata.create_all(bind=engine)
+        # With AUTO_MIGRATE=false the schema is owned by `python -m app.manage migrate` and boot never touches it.
+        if settings.auto_migrate:
+            with timings.phase("migrations"):
+                apply_migrations(engine)
+        if settings.patients_partitioning:
+            with timings.phase("partitions"):
+                # Converting copies the whole table under an exclusive lock; that is an explicit
+                # `manage partitions --convert` step, never part of a worker boot.
+                partitioning.maintain(engine)
+
+    @application.on_event("shutdown")
+    def on_shutdown() -> None:
+        shutdown_job_runner()
+        events.stop_listener()
+
+    @application.on_event("startup")
+    async def schedule_partition_maintenance() -> None:
+        if settings.patients_partitioning:
+            application.state.partition_maintenance = asyncio.create_task(
+                _maintain_partitions_periodically(settings.patients_partition_maintenance_interval)
+            )
+
+    @application.on_event("startup")
+    async def start_warmup() -> None:
+        timings.mark_ready()
+        if settings.startup_warmup:
+            steps = {
+                "warm_jwks": warm_jwks,
+                "warm_pool": partial(warm_pool, {engine, replica_engine}, settings.startup_warm_connections),
+            }
+            application.state.warmup = asyncio.create_task(warm_up(timings, steps))
 
     application.include_router(api_router, prefix="/api")
 
@@ -29,6 +129,18 @@ def create_app() -> FastAPI:
     async def health_check() -> dict[str, str]:
         return {"status": "ok"}
 
+    if settings.metrics_enabled:
+
+        @application.get("/metrics")
+        async def metrics() -> dict:
+            return registry.snapshot()
+
+        registry.register_gauge("startup", timings.snapshot)
+        registry.register_gauge("patient_event_subscribers", lambda: events.get_broadcaster().subscribers)
+        registry.register_gauge("admission", lambda: {name: limiter.snapshot() for name, limiter in limiters.items()})
+
+    application.state.startup_timings = timings
+    timings.record("create_app", time.perf_counter() - created)
     return application
 
 
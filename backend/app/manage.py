@@ -0,0 +1,61 @@
+﻿import argparse
+import logging
+from datetime import date
+
+from app.crud import patient_stats
+from app.db import partitioning
+from app.db.migrations import apply_migrations, pending_migrations
+from app.db.session import SessionLocal, engine
+
+
+def _migrate(args: argparse.Namespace) -> None:
+    if args.dry_run:
+        for item in pending_migrations(engine):
+            print(f"{item.version}  {item.description}")
+        return
+    applied = apply_migrations(engine)
+    print(f"Applied {len(applied)} migration(s): {', '.join(applied) or '-'}")
+
+
+def _rebuild_stats(args: argparse.Namespace) -> None:
+    with SessionLocal() as db:
+        rows = patient_stats.rebuild(db, start_date=args.start_date, end_date=args.end_date)
+    print(f"Rebuilt patient_daily_stats: {rows} row(s)")
+
+
+def _partitions(args: argparse.Namespace) -> None:
+    report = partitioning.maintain(engine, convert=args.convert)
+    if report["converted"] is not None:
+        print(f"Converted patients to a partitioned table: {report['converted']} row(s) copied")
+    print(f"Created partition(s): {', '.join(report['created']) or '-'}")
+    print(f"Archived partition(s): {', '.join(report['archived']) or '-'}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Apply pending schema migrations")
+    migrate.add_argument("--dry-run", action="store_true", help="Only list pending migrations")
+    migrate.set_defaults(handler=_migrate)
+
+    rebuild_stats = commands.add_parser("rebuild-stats", help="Recompute the daily visit rollup from patients")
+    rebuild_stats.add_argument("--start-date", type=date.fromisoformat, default=None)
+    rebuild_stats.add_argument("--end-date", type=date.fromisoformat, default=None)
+    rebuild_stats.set_defaults(handler=_rebuild_stats)
+
+    partitions = commands.add_parser(
+        "partitions", help="Create upcoming patients partitions and archive expired ones (PostgreSQL)"
+    )
+    partitions.add_argument(
+        "--convert", action="store_true", help="Convert an unpartitioned patients table first (locks it while copying)"
+    )
+    partitions.set_defaults(handler=_partitions)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
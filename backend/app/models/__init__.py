@@ -1,4 +1,6 @@
-﻿from .patient import Patient
+﻿from .job import Job, JobKind, JobStatus
+from .patient import Patient
+from .patient_stats import PatientDailyStat
 from .user import User, UserRole
 
-__all__ = ["Patient", "User", "UserRole"]
+__all__ = ["Job", "JobKind", "JobStatus", "Patient", "PatientDailyStat", "User", "UserRole"]
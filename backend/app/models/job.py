@@ -0,0 +1,34 @@
+﻿from enum import Enum
+
+from sqlalchemy import JSON, Column, DateTime, Enum as SQLEnum, ForeignKey, Integer, String, Text, func
+
+from app.db.session import Base
+
+
+class JobKind(str, Enum):
+    EXPORT = "export"
+    IMPORT = "import"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(SQLEnum(JobKind, name="job_kind"), nullable=False)
+    status = Column(SQLEnum(JobStatus, name="job_status"), nullable=False, default=JobStatus.QUEUED, index=True)
+    params = Column(JSON, nullable=False, default=dict)
+    progress = Column(Integer, nullable=False, default=0)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    file_path = Column(String(512), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
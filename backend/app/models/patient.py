@@ -1,10 +1,48 @@
-﻿from sqlalchemy import Column, Date, DateTime, Integer, String, func
+﻿from sqlalchemy import DDL, Column, Date, DateTime, Index, Integer, String, event, func, text
 
 from app.db.session import Base
 
+# Name ranks above diagnosis, tindakan and dokter. Queries must repeat this exact expression to hit the index.
+SEARCH_DOCUMENT_SQL = (
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', diagnosis), 'B') || "
+    "setweight(to_tsvector('simple', tindakan), 'C') || "
+    "setweight(to_tsvector('simple', dokter), 'D')"
+)
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+    "name, diagnosis, tindakan, dokter, content='patients', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN "
+    "INSERT INTO patients_fts(rowid, name, diagnosis, tindakan, dokter) "
+    "VALUES (new.id, new.name, new.diagnosis, new.tindakan, new.dokter); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN "
+    "INSERT INTO patients_fts(patients_fts, rowid, name, diagnosis, tindakan, dokter) "
+    "VALUES ('delete', old.id, old.name, old.diagnosis, old.tindakan, old.dokter); END",
+    "CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE OF name, diagnosis, tindakan, dokter ON patients BEGIN "
+    "INSERT INTO patients_fts(patients_fts, rowid, name, diagnosis, tindakan, dokter) "
+    "VALUES ('delete', old.id, old.name, old.diagnosis, old.tindakan, old.dokter); "
+    "INSERT INTO patients_fts(rowid, name, diagnosis, tindakan, dokter) "
+    "VALUES (new.id, new.name, new.diagnosis, new.tindakan, new.dokter); END",
+)
+
 
 class Patient(Base):
     __tablename__ = "patients"
+    __table_args__ = (
+        Index("ix_patients_tanggal_kunjungan_id", "tanggal_kunjungan", "id"),
+        Index(
+            "ix_patients_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index("ix_patients_source_external", "source_system", "external_id"),
+        Index("ix_patients_search", text(f"({SEARCH_DOCUMENT_SQL})"), postgresql_using="gin").ddl_if(
+            dialect="postgresql"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -13,4 +51,16 @@ class Patient(Base):
     diagnosis = Column(String(255), nullable=False)
     tindakan = Column(String(255), nullable=False)
     dokter = Column(String(255), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    source_system = Column(String(64), nullable=True)
+    external_id = Column(String(128), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+event.listen(
+    Patient.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Patient.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
@@ -0,0 +1,12 @@
+﻿from sqlalchemy import Column, Date, Integer, String
+
+from app.db.session import Base
+
+
+class PatientDailyStat(Base):
+    __tablename__ = "patient_daily_stats"
+
+    visit_date = Column(Date, primary_key=True)
+    dokter = Column(String(255), primary_key=True)
+    diagnosis = Column(String(255), primary_key=True)
+    visit_count = Column(Integer, nullable=False, default=0)
@@ -1,32 +1,76 @@
 ﻿from datetime import date
 from typing import List
 
-from pydantic import BaseModel, Field
-
-from app.schemas.patient import PatientCreate
+from pydantic import BaseModel, Field, model_validator
 
 
 class PatientImportItem(BaseModel):
-    name: str
+    name: str = Field(max_length=255)
     tanggal_kunjungan: date
     tanggal_lahir: date | None = Field(default=None, description="Optional birth date")
-    diagnosis: str | None = Field(default=None, description="Optional diagnosis")
-    tindakan: str | None = Field(default=None, description="Optional treatment")
-    dokter: str | None = Field(default=None, description="Optional doctor name")
+    diagnosis: str | None = Field(default=None, max_length=255, description="Optional diagnosis")
+    tindakan: str | None = Field(default=None, max_length=255, description="Optional treatment")
+    dokter: str | None = Field(default=None, max_length=255, description="Optional doctor name")
+    external_id: str | None = Field(default=None, max_length=128, description="Row id in the source system")
+
+    def to_row(self) -> dict:
+        return {
+            "name": self.name,
+            "tanggal_kunjungan": self.tanggal_kunjungan,
+            "tanggal_lahir": self.tanggal_lahir or self.tanggal_kunjungan,
+            "diagnosis": self.diagnosis or "Belum ada diagnosis",
+            "tindakan": self.tindakan or "Belum ada tindakan",
+            "dokter": self.dokter or "Belum ditugaskan",
+        }
+
+    def to_synced_row(self) -> dict:
+        return {**self.to_row(), "external_id": self.external_id}
 
 
 class ImportPatientsRequest(BaseModel):
+    source_system: str | None = Field(
+        default=None,
+        max_length=64,
+        description="When set, rows are matched on external_id: new ones are inserted, changed ones updated",
+    )
     patients: List[PatientImportItem]
 
-    def to_patient_creates(self) -> List[PatientCreate]:
-        return [
-            PatientCreate(
-                name=item.name,
-                tanggal_kunjungan=item.tanggal_kunjungan,
-                tanggal_lahir=item.tanggal_lahir or item.tanggal_kunjungan,
-                diagnosis=item.diagnosis or "Belum ada diagnosis",
-                tindakan=item.tindakan or "Belum ada tindakan",
-                dokter=item.dokter or "Belum ditugaskan",
-            )
-            for item in self.patients
-        ]
+    @model_validator(mode="after")
+    def require_external_ids(self) -> "ImportPatientsRequest":
+        if self.source_system is not None and any(item.external_id is None for item in self.patients):
+            raise ValueError("Every patient needs an external_id when source_system is set")
+        return self
+
+    def to_patient_rows(self) -> List[dict]:
+        if self.source_system is not None:
+            return [item.to_synced_row() for item in self.patients]
+        return [item.to_row() for item in self.patients]
+
+
+class ImportBatchResult(BaseModel):
+    batch: int
+    first_row: int
+    rows: int
+    imported: int
+    updated: int = 0
+    unchanged: int = 0
+    error: str | None = None
+
+
+class ImportResult(BaseModel):
+    imported: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    batches: List[ImportBatchResult] = []
+
+
+class RejectedRow(BaseModel):
+    line: int
+    error: str
+
+
+class StreamImportResult(ImportResult):
+    accepted: int = 0
+    rejected: int = 0
+    rejected_rows: List[RejectedRow] = []
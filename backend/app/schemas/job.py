@@ -0,0 +1,21 @@
+﻿from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+from app.models.job import JobKind, JobStatus
+
+
+class JobRead(BaseModel):
+    id: str
+    kind: JobKind
+    status: JobStatus
+    params: dict[str, Any]
+    progress: int
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    model_config = {"from_attributes": True}
@@ -1,7 +1,7 @@
 ﻿from datetime import date
 from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PatientBase(BaseModel):
@@ -32,14 +32,48 @@ class PatientRead(PatientBase):
     model_config = {"from_attributes": True}
 
 
+class ReassignDokterRequest(BaseModel):
+    from_dokter: str = Field(min_length=1)
+    to_dokter: str = Field(min_length=1)
+    start_date: date | None = None
+    end_date: date | None = None
+
+
+class BulkUpdateResult(BaseModel):
+    updated: int
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=10000)
+
+
+class BulkDeleteResult(BaseModel):
+    deleted: int
+    missing: List[int] = []
+
+
 class PatientsListResponse(BaseModel):
     items: List[PatientRead]
-    total: int
+    total: int | None
+    next_cursor: str | None = None
+
+
+class SummaryBucket(BaseModel):
+    label: str
+    count: int
+
+
+class DailyCount(BaseModel):
+    date: date
+    count: int
 
 
 class PatientSummary(BaseModel):
     total_patients: int
     total_today: int
+    by_day: List[DailyCount] = []
+    by_doctor: List[SummaryBucket] = []
+    by_diagnosis: List[SummaryBucket] = []
 
 
 class PatientReport(BaseModel):
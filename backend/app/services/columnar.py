@@ -0,0 +1,121 @@
+﻿import io
+from collections.abc import Callable, Sequence
+from datetime import date
+
+import orjson
+from fastapi import HTTPException, Request, status
+
+from app.crud.patient import PATIENT_COLUMNS
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.rumahsakit.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+REPRESENTATIONS = (JSON, COLUMNAR_JSON, ARROW_STREAM, PARQUET)
+BINARY_REPRESENTATIONS = {ARROW_STREAM, PARQUET}
+
+FIELDS = tuple(column.key for column in PATIENT_COLUMNS)
+DATE_FIELDS = {"tanggal_lahir", "tanggal_kunjungan"}
+# Low-cardinality text that repeats on almost every row.
+DICTIONARY_FIELDS = {"diagnosis", "tindakan", "dokter"}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def negotiate(request: Request) -> str:
+    accepted: list[tuple[float, int, str]] = []
+    for position, item in enumerate(request.headers.get("accept", "").split(",")):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type in REPRESENTATIONS and quality > 0:
+            accepted.append((-quality, position, media_type))
+
+    for _, _, media_type in sorted(accepted):
+        if media_type in BINARY_REPRESENTATIONS and not _pyarrow_available():
+            continue
+        return media_type
+    if accepted:
+        # Only binary formats were asked for and pyarrow is not installed.
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow and Parquet responses require pyarrow on the server",
+        )
+    return JSON
+
+
+def _dictionary_encode(values: Sequence[str]) -> dict:
+    codes: dict[str, int] = {}
+    indices = [codes.setdefault(value, len(codes)) for value in values]
+    return {"dictionary": list(codes), "indices": indices}
+
+
+def _column_block(rows: Sequence) -> dict:
+    columns = dict(zip(FIELDS, map(list, zip(*rows)))) if rows else {field: [] for field in FIELDS}
+    for field in DATE_FIELDS:
+        # Days since 1970-01-01, the same encoding as Arrow's date32.
+        columns[field] = [value.toordinal() - _EPOCH_ORDINAL for value in columns[field]]
+    for field in DICTIONARY_FIELDS:
+        columns[field] = _dictionary_encode(columns[field])
+    return {"length": len(rows), "columns": columns}
+
+
+def _arrow_table(rows: Sequence, metadata: dict):
+    import pyarrow as pa
+
+    values = list(zip(*rows)) if rows else [[] for _ in FIELDS]
+    arrays = []
+    for field, column in zip(FIELDS, values):
+        if field in DATE_FIELDS:
+            arrays.append(pa.array(column, type=pa.date32()))
+        elif field in DICTIONARY_FIELDS:
+            arrays.append(pa.array(column, type=pa.string()).dictionary_encode())
+        elif field == "id":
+            arrays.append(pa.array(column, type=pa.int64()))
+        else:
+            arrays.append(pa.array(column, type=pa.string()))
+    # Non-row parts of the response (totals, cursors, summaries) travel as JSON schema metadata.
+    schema_metadata = {key: orjson.dumps(value) for key, value in metadata.items()}
+    return pa.Table.from_arrays(arrays, names=list(FIELDS)).replace_schema_metadata(schema_metadata)
+
+
+def _render(representation: str, rows: Sequence, *, rows_key: str, metadata: dict) -> bytes:
+    if representation == COLUMNAR_JSON:
+        return orjson.dumps({rows_key: _column_block(rows), **metadata})
+    if representation == ARROW_STREAM:
+        import pyarrow as pa
+
+        table = _arrow_table(rows, metadata)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    if representation == PARQUET:
+        import pyarrow.parquet as pq
+
+        sink = io.BytesIO()
+        pq.write_table(_arrow_table(rows, metadata), sink)
+        return sink.getvalue()
+    return orjson.dumps({rows_key: [row._asdict() for row in rows], **metadata})
+
+
+def renderer(representation: str, *, rows_key: str) -> Callable[[dict], bytes]:
+    def render(payload: dict) -> bytes:
+        metadata = {key: value for key, value in payload.items() if key != rows_key}
+        return _render(representation, payload[rows_key], rows_key=rows_key, metadata=metadata)
+
+    return render
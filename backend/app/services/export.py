@@ -0,0 +1,91 @@
+﻿import csv
+import io
+import tempfile
+from collections.abc import Iterable, Iterator
+from datetime import date
+
+from app.core.config import get_settings
+from app.crud import patient as patient_crud
+from app.db.session import ReadSessionLocal
+
+EXPORT_HEADERS = ["ID", "Nama", "Tanggal Lahir", "Tanggal Kunjungan", "Diagnosis", "Tindakan", "Dokter"]
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "patients-report.xlsx"),
+    "csv": ("text/csv; charset=utf-8", "patients-report.csv"),
+}
+
+
+def iter_export_rows(
+    *,
+    name: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+) -> Iterator[list]:
+    batch_size = get_settings().export_batch_size
+    # The request-scoped session is closed before a streaming body runs, so the export owns its own.
+    with ReadSessionLocal() as db:
+        for row in patient_crud.iter_patient_rows(
+            db,
+            name=name,
+            start_date=start_date,
+            end_date=end_date,
+            batch_size=batch_size,
+        ):
+            patient_id, patient_name, tanggal_lahir, tanggal_kunjungan, diagnosis, tindakan, dokter = row
+            yield [
+                patient_id,
+                patient_name,
+                tanggal_lahir.isoformat(),
+                tanggal_kunjungan.isoformat(),
+                diagnosis,
+                tindakan,
+                dokter,
+            ]
+
+
+def stream_csv(rows: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_xlsx(rows: Iterable[list]) -> Iterator[bytes]:
+    # openpyxl is heavy to import and most workers never export, so it loads on the first xlsx export.
+    from openpyxl import Workbook
+
+    # Write-only mode spools rows to disk as they are appended; the zip container is only
+    # complete after save, so the finished file is streamed back from a temp file.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Patients")
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while chunk := spool.read(CHUNK_SIZE):
+            yield chunk
+
+
+def stream_export(
+    export_format: str,
+    *,
+    name: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+) -> Iterator[bytes]:
+    rows = iter_export_rows(name=name, start_date=start_date, end_date=end_date)
+    if export_format == "csv":
+        return stream_csv(rows)
+    return stream_xlsx(rows)
@@ -0,0 +1,191 @@
+﻿import asyncio
+import csv
+import json
+import logging
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.crud import patient as patient_crud
+from app.db.session import Database
+from app.schemas.integration import (
+    ImportBatchResult,
+    ImportResult,
+    PatientImportItem,
+    RejectedRow,
+    StreamImportResult,
+)
+
+try:
+    import psycopg
+except ImportError:  # pragma: no cover - only needed for PostgreSQL
+    psycopg = None
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_REJECTIONS = 1000
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines"}
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+
+# COPY talks to the psycopg cursor directly, so its failures are not wrapped in SQLAlchemy exceptions.
+BATCH_ERRORS: tuple[type[Exception], ...] = (SQLAlchemyError,) if psycopg is None else (SQLAlchemyError, psycopg.Error)
+
+
+def batched(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def insert_batch(
+    db: Session,
+    index: int,
+    first_row: int,
+    batch: list[dict],
+    source_system: str | None = None,
+) -> ImportBatchResult:
+    progress = ImportBatchResult(batch=index, first_row=first_row, rows=len(batch), imported=0)
+    use_copy = get_settings().import_use_copy
+    try:
+        if source_system is None:
+            progress.imported = patient_crud.bulk_insert_patients(db, batch, use_copy=use_copy)
+        else:
+            progress.imported, progress.updated, progress.unchanged = patient_crud.sync_patients(
+                db, source_system, batch, use_copy=use_copy
+            )
+    except BATCH_ERRORS as exc:
+        db.rollback()
+        logger.warning("Import batch %s failed: %s", index, exc)
+        progress.error = str(getattr(exc, "orig", None) or exc)
+    return progress
+
+
+def _record(result: ImportResult, progress: ImportBatchResult) -> None:
+    result.imported += progress.imported
+    result.updated += progress.updated
+    result.unchanged += progress.unchanged
+    if progress.error is not None:
+        result.failed += progress.rows
+    result.batches.append(progress)
+
+
+def import_patient_rows(
+    db: Session,
+    rows: Iterable[dict],
+    *,
+    batch_size: int | None = None,
+    source_system: str | None = None,
+    on_batch: Callable[[ImportBatchResult], None] | None = None,
+) -> ImportResult:
+    batch_size = batch_size or get_settings().import_batch_size
+    result = ImportResult()
+    first_row = 0
+
+    for index, batch in enumerate(batched(rows, batch_size)):
+        progress = insert_batch(db, index, first_row, batch, source_system)
+        _record(result, progress)
+        first_row += len(batch)
+        if on_batch is not None:
+            on_batch(progress)
+
+    return result
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_number += 1
+            yield line_number, raw.decode("utf-8", errors="replace").rstrip("\r").lstrip("\ufeff")
+    if buffer:
+        yield line_number + 1, buffer.decode("utf-8", errors="replace").rstrip("\r").lstrip("\ufeff")
+
+
+def _parse_csv_line(header: list[str], line: str) -> dict:
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise ValueError(f"Expected {len(header)} columns, got {len(values)}")
+    return {key: value or None for key, value in zip(header, values)}
+
+
+async def import_patient_stream(
+    db: Database,
+    chunks: AsyncIterator[bytes],
+    *,
+    content_type: str,
+    batch_size: int | None = None,
+    source_system: str | None = None,
+    on_batch: Callable[[ImportBatchResult], None] | None = None,
+) -> StreamImportResult:
+    batch_size = batch_size or get_settings().import_batch_size
+    is_csv = content_type in CSV_CONTENT_TYPES
+    result = StreamImportResult()
+    header: list[str] | None = None
+    batch: list[dict] = []
+    batch_first_line = 0
+    batch_index = 0
+    # At most one batch is being written while the next one is read and validated; the session is never shared.
+    pending: asyncio.Future[ImportBatchResult] | None = None
+
+    async def finish_pending() -> None:
+        nonlocal pending
+        if pending is not None:
+            progress = await pending
+            pending = None
+            _record(result, progress)
+            if on_batch is not None:
+                on_batch(progress)
+
+    async def flush(rows: list[dict], first_line: int) -> None:
+        nonlocal pending, batch_index
+        await finish_pending()
+        pending = asyncio.ensure_future(db.run(insert_batch, batch_index, first_line, rows, source_system))
+        batch_index += 1
+
+    try:
+        async for line_number, line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            if is_csv and header is None:
+                header = [column.strip() for column in next(csv.reader([line]))]
+                continue
+            try:
+                data = _parse_csv_line(header, line) if is_csv else json.loads(line)
+                item = PatientImportItem.model_validate(data)
+                if source_system is None:
+                    row = item.to_row()
+                elif item.external_id is None:
+                    raise ValueError("external_id is required when source_system is set")
+                else:
+                    row = item.to_synced_row()
+            except (ValueError, ValidationError) as exc:
+                result.rejected += 1
+                if len(result.rejected_rows) < MAX_REPORTED_REJECTIONS:
+                    message = "; ".join(error["msg"] for error in exc.errors()) if isinstance(exc, ValidationError) else str(exc)
+                    result.rejected_rows.append(RejectedRow(line=line_number, error=message))
+                continue
+
+            if not batch:
+                batch_first_line = line_number
+            batch.append(row)
+            result.accepted += 1
+            if len(batch) >= batch_size:
+                await flush(batch, batch_first_line)
+                batch = []
+
+        if batch:
+            await flush(batch, batch_first_line)
+        await finish_pending()
+    finally:
+        if pending is not None:
+            # The upload failed mid-way: let the batch already on its way finish before the session is closed.
+            await asyncio.wait([pending])
+    return result
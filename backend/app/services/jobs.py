@@ -0,0 +1,180 @@
+﻿import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.crud import job as job_crud
+from app.db.session import Database, SessionLocal
+from app.models.job import JobKind, JobStatus
+from app.services.export import CHUNK_SIZE, iter_export_rows, stream_csv, stream_xlsx
+from app.services.importer import import_patient_stream
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 5000
+
+
+def storage_dir() -> Path:
+    path = Path(get_settings().jobs_storage_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def upload_path(job_id: str) -> Path:
+    return storage_dir() / f"{job_id}.upload"
+
+
+def _report_progress(job_id: str, progress: int) -> None:
+    with SessionLocal() as db:
+        job_crud.set_progress(db, job_id, progress)
+
+
+def _counted(rows: Iterable[list], job_id: str) -> Iterator[list]:
+    count = 0
+    for count, row in enumerate(rows, start=1):
+        yield row
+        if count % PROGRESS_EVERY == 0:
+            _report_progress(job_id, count)
+    _report_progress(job_id, count)
+
+
+def _run_export(job_id: str, params: dict) -> tuple[dict, str]:
+    export_format = params["format"]
+    target = storage_dir() / f"{job_id}.{export_format}"
+    rows = iter_export_rows(
+        name=params.get("name"),
+        start_date=date.fromisoformat(params["start_date"]) if params.get("start_date") else None,
+        end_date=date.fromisoformat(params["end_date"]) if params.get("end_date") else None,
+    )
+    writer = stream_csv if export_format == "csv" else stream_xlsx
+    partial = target.with_suffix(target.suffix + ".part")
+    size = 0
+    with partial.open("wb") as handle:
+        for chunk in writer(_counted(rows, job_id)):
+            handle.write(chunk)
+            size += len(chunk)
+    os.replace(partial, target)
+    return {"format": export_format, "bytes": size}, str(target)
+
+
+async def _file_chunks(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as handle:
+        while chunk := handle.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _run_import(job_id: str, params: dict) -> tuple[dict, None]:
+    source = upload_path(job_id)
+    imported = 0
+
+    def on_batch(progress) -> None:
+        nonlocal imported
+        imported += progress.imported + progress.updated + progress.unchanged
+        _report_progress(job_id, imported)
+
+    async def run() -> dict:
+        with SessionLocal() as db:
+            result = await import_patient_stream(
+                Database(db),
+                _file_chunks(source),
+                content_type=params["content_type"],
+                source_system=params.get("source_system"),
+                on_batch=on_batch,
+            )
+        return result.model_dump(mode="json")
+
+    try:
+        return asyncio.run(run()), None
+    finally:
+        source.unlink(missing_ok=True)
+
+
+_HANDLERS = {
+    JobKind.EXPORT: _run_export,
+    JobKind.IMPORT: _run_import,
+}
+
+
+def run_job(job_id: str) -> None:
+    with SessionLocal() as db:
+        job = job_crud.get_job(db, job_id)
+        if job is None:
+            logger.warning("Job %s disappeared before it ran", job_id)
+            return
+        kind, params = job.kind, dict(job.params)
+        job_crud.mark_running(db, job_id)
+
+    try:
+        result, file_path = _HANDLERS[kind](job_id, params)
+    except Exception as exc:
+        logger.exception("Job %s failed", job_id)
+        with SessionLocal() as db:
+            job_crud.mark_finished(db, job_id, status=JobStatus.FAILED, error=str(exc))
+        return
+
+    with SessionLocal() as db:
+        job_crud.mark_finished(db, job_id, status=JobStatus.SUCCEEDED, result=result, file_path=file_path)
+
+
+def _mark_crashed(job_id: str, done: Future) -> None:
+    # run_job records its own failures; this only fires if the worker itself died.
+    error = done.exception()
+    if error is None:
+        return
+    logger.error("Job %s crashed: %s", job_id, error)
+    with SessionLocal() as db:
+        job_crud.mark_finished(db, job_id, status=JobStatus.FAILED, error=f"Worker crashed: {error}")
+
+
+def _create_executor() -> Executor:
+    settings = get_settings()
+    if settings.jobs_runner == "local":
+        # Same process, separate threads: handy for tests and single-process development.
+        return ThreadPoolExecutor(max_workers=settings.jobs_workers, thread_name_prefix="job")
+    # Spawned workers start with fresh engines instead of inheriting the parent's pooled connections.
+    return ProcessPoolExecutor(max_workers=settings.jobs_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+class JobRunner:
+    def __init__(self) -> None:
+        self.executor = _create_executor()
+
+    def submit(self, job_id: str) -> None:
+        try:
+            future = self.executor.submit(run_job, job_id)
+        except BrokenExecutor:
+            # A worker died hard (OOM kill, segfault); start a fresh pool rather than refusing jobs forever.
+            self.executor = _create_executor()
+            future = self.executor.submit(run_job, job_id)
+        future.add_done_callback(partial(_mark_crashed, job_id))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+_runner: JobRunner | None = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner()
+    return _runner
+
+
+def shutdown_job_runner() -> None:
+    global _runner
+    with _runner_lock:
+        if _runner is not None:
+            _runner.shutdown()
+            _runner = None
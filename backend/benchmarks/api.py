@@ -0,0 +1,167 @@
+﻿import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _deep_cursor(depth: int) -> str | None:
+    from app.crud import patient as patient_crud
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as db:
+        items, _ = patient_crud.list_patients(db, skip=depth, limit=1, count="none")
+    return patient_crud.encode_cursor(items[0]) if items else None
+
+
+def _import_payload(rows: int, *, seed: int) -> dict:
+    from benchmarks.harness import synthetic_patients
+
+    patients = []
+    for row in synthetic_patients(rows, seed=seed):
+        patients.append(
+            {
+                "name": row["name"],
+                "tanggal_kunjungan": row["tanggal_kunjungan"].isoformat(),
+                "tanggal_lahir": row["tanggal_lahir"].isoformat(),
+                "diagnosis": row["diagnosis"],
+                "tindakan": row["tindakan"],
+                "dokter": row["dokter"],
+            }
+        )
+    return {"patients": patients}
+
+
+async def _run(args: argparse.Namespace, auth) -> dict:
+    import httpx
+
+    from app.main import app
+    from benchmarks.harness import run_load, seed_database
+
+    started = time.perf_counter()
+    seed_database(args.patients)
+    seed_seconds = time.perf_counter() - started
+
+    tokens = [
+        auth.token(sub=f"bench|user-{index}", email=f"user{index}@rumahsakit-bench.example.com", role="dokter")
+        for index in range(args.users)
+    ]
+    deep = max(0, args.patients - 100)
+    cursor = _deep_cursor(deep)
+    name_filter = "Siti"
+
+    scenarios = {
+        "users_me": ("GET", "/api/users/me", {}),
+        "patients_shallow": ("GET", "/api/patients?limit=50", {}),
+        "patients_deep_offset": ("GET", f"/api/patients?limit=50&skip={deep}", {}),
+        "patients_deep_cursor": ("GET", f"/api/patients?limit=50&count=none&cursor={cursor}", {}),
+        "patients_name_filter": ("GET", f"/api/patients?limit=50&name={name_filter}", {}),
+        "report": ("GET", "/api/reports/patients", {}),
+        "report_name_filter": ("GET", f"/api/reports/patients?name={name_filter}", {}),
+        "export_xlsx": ("GET", "/api/reports/patients/export", {"requests": args.export_requests}),
+        "export_csv": ("GET", "/api/reports/patients/export?format=csv", {"requests": args.export_requests}),
+        "import_bulk": (
+            "POST",
+            "/api/integrations/patients/import",
+            {"requests": args.import_requests, "json": _import_payload(args.import_rows, seed=args.patients + 1)},
+        ),
+    }
+    selected = args.scenarios or list(scenarios)
+
+    results: dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm the JWKS fetch and the user cache for every synthetic user.
+        for token in tokens:
+            await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+
+        for name in selected:
+            method, url, options = scenarios[name]
+            options = dict(options)
+            requests = options.pop("requests", args.requests)
+            token = tokens[len(results) % len(tokens)]
+            results[name] = await run_load(
+                client,
+                method,
+                url,
+                requests=requests,
+                concurrency=min(args.concurrency, requests),
+                headers={"Authorization": f"Bearer {token}"},
+                **options,
+            )
+            results[name]["url"] = url
+
+    return {"seed_seconds": round(seed_seconds, 3), "scenarios": results}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.api",
+        description="Throughput and p50/p99 latency for the API hot paths, emitted as JSON.",
+    )
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--patients", type=int, default=10_000, help="Synthetic patients to seed (10k to 5M)")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--export-requests", type=int, default=3)
+    parser.add_argument("--import-requests", type=int, default=3)
+    parser.add_argument("--import-rows", type=int, default=5_000)
+    parser.add_argument("--response-cache", action="store_true", help="Keep the response cache on (off by default)")
+    parser.add_argument(
+        "--admission-control",
+        action="store_true",
+        help="Keep admission control on (off by default; each scenario runs as one user)",
+    )
+    parser.add_argument("--scenarios", nargs="+", default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON result to this file")
+    args = parser.parse_args(argv)
+
+    from benchmarks.harness import LocalAuth0, configure_environment
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="rs-bench-"), "bench.db")
+    auth = LocalAuth0()
+    configure_environment(
+        database_url,
+        auth,
+        RESPONSE_CACHE_BACKEND="memory" if args.response_cache else "none",
+        ADMISSION_CONTROL="true" if args.admission_control else "false",
+    )
+
+    measured = asyncio.run(_run(args, auth))
+    report = {
+        "benchmark": "api",
+        "commit": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": database_url.split(":", 1)[0],
+        "patients": args.patients,
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "response_cache": args.response_cache,
+        "admission_control": args.admission_control,
+        **measured,
+    }
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(rendered)
+    print(rendered)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+﻿import argparse
+import json
+import sys
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def compare(baseline: dict, candidate: dict, *, tolerance: float) -> tuple[list[dict], bool]:
+    rows = []
+    regressed = False
+    for name, before in baseline.get("scenarios", {}).items():
+        after = candidate.get("scenarios", {}).get(name)
+        if after is None:
+            continue
+        p50_change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0.0
+        rps_change = (after["rps"] - before["rps"]) / before["rps"] if before["rps"] else 0.0
+        is_regression = p50_change > tolerance or rps_change < -tolerance
+        regressed = regressed or is_regression
+        rows.append(
+            {
+                "scenario": name,
+                "p50_ms": [before["p50_ms"], after["p50_ms"]],
+                "p99_ms": [before["p99_ms"], after["p99_ms"]],
+                "rps": [before["rps"], after["rps"]],
+                "p50_change": round(p50_change, 4),
+                "rps_change": round(rps_change, 4),
+                "regression": is_regression,
+            }
+        )
+    return rows, regressed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Compare two benchmarks.api JSON results; exits 1 when a scenario regressed.",
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown (default 10%%)")
+    args = parser.parse_args(argv)
+
+    baseline, candidate = _load(args.baseline), _load(args.candidate)
+    rows, regressed = compare(baseline, candidate, tolerance=args.tolerance)
+    print(
+        json.dumps(
+            {"baseline": baseline.get("commit"), "candidate": candidate.get("commit"), "results": rows, "regressed": regressed},
+            indent=2,
+        )
+    )
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+﻿import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+SCENARIOS = {
+    "users_me": ("/api/users/me", {}),
+    "patients_page": ("/api/patients?limit=100", {}),
+    "report_json": ("/api/reports/patients", {}),
+    "report_columnar": ("/api/reports/patients", {"Accept": "application/vnd.rumahsakit.columnar+json"}),
+    "export_csv": ("/api/reports/patients/export?format=csv", {}),
+    "export_xlsx": ("/api/reports/patients/export", {}),
+}
+
+
+async def _measure(args: argparse.Namespace, auth) -> dict:
+    import httpx
+
+    from app.core.compression import brotli
+    from app.main import app
+    from benchmarks.harness import seed_database
+
+    seed_database(args.patients)
+    token = auth.token(sub="bench|dokter", email="dokter@rumahsakit-bench.example.com")
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+    results: dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, (url, extra_headers) in SCENARIOS.items():
+            sizes: dict[str, int] = {}
+            reference = None
+            for encoding in encodings:
+                headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding, **extra_headers}
+                response = await client.get(url, headers=headers)
+                response.raise_for_status()
+                sizes[encoding] = response.num_bytes_downloaded
+                body = response.content
+                if reference is None:
+                    reference = body
+                elif name != "export_xlsx" and body != reference:
+                    # xlsx zips carry timestamps; every other body must decode to the identical bytes.
+                    raise AssertionError(f"{name}: {encoding} body does not decode to the identity body")
+            results[name] = {
+                "bytes": sizes,
+                "saved": {
+                    encoding: round(1 - size / sizes["identity"], 4) if sizes["identity"] else 0.0
+                    for encoding, size in sizes.items()
+                    if encoding != "identity"
+                },
+            }
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compression",
+        description="Bytes on the wire per endpoint with identity, gzip and (if installed) brotli encoding.",
+    )
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--output", default=None, help="Write the JSON result to this file")
+    args = parser.parse_args(argv)
+
+    from benchmarks.harness import LocalAuth0, configure_environment
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="rs-bench-"), "bench.db")
+    auth = LocalAuth0()
+    configure_environment(database_url, auth, COMPRESSION_ENABLED="true", RESPONSE_CACHE_BACKEND="none")
+
+    report = {"benchmark": "compression", "patients": args.patients, "scenarios": asyncio.run(_measure(args, auth))}
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(rendered)
+    print(rendered)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+﻿import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+async def _measure(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app.main import app
+    from benchmarks.harness import seed_database, run_load
+
+    seed_database(args.patients)
+    headers = {"Authorization": f"Bearer {AUTH.token(sub='bench|dokter', email='dokter@rumahsakit-bench.example.com')}"}
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/users/me", headers=headers)
+        for concurrency in args.concurrency:
+            results[str(concurrency)] = {
+                "list": await run_load(
+                    client, "GET", "/api/patients", headers=headers, requests=args.requests, concurrency=concurrency
+                ),
+                "report": await run_load(
+                    client, "GET", "/api/reports/patients", headers=headers, requests=args.requests, concurrency=concurrency
+                ),
+            }
+    return results
+
+
+def _run_mode(args: argparse.Namespace) -> None:
+    global AUTH
+    from benchmarks.harness import LocalAuth0, configure_environment
+
+    AUTH = LocalAuth0()
+    overrides = {
+        "DATABASE_ASYNC": "true" if args.mode == "async" else "false",
+        # Every request comes from one user, so the per-user report limit would reject almost all of them.
+        "ADMISSION_CONTROL": "false",
+        # Otherwise every request after the first is a cache hit and neither database path is measured.
+        "RESPONSE_CACHE_BACKEND": "none",
+    }
+    if args.mode == "async" and args.async_database_url:
+        overrides["DATABASE_ASYNC_URL"] = args.async_database_url
+    configure_environment(args.database_url, AUTH, **overrides)
+    print(json.dumps({"mode": args.mode, "results": asyncio.run(_measure(args))}))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.concurrency",
+        description="Compare requests/sec of the sync (threadpool) and async database modes under concurrency.",
+    )
+    parser.add_argument("--database-url", default=None, help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--async-database-url", default=None, help="Async driver URL, e.g. sqlite+aiosqlite:///...")
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--mode", choices=["sync", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--output", default=None, help="Write the JSON result to this file")
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        _run_mode(args)
+        return
+
+    if args.database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="rs-bench-"), "bench.db")
+        args.database_url = f"sqlite:///{path}"
+        args.async_database_url = args.async_database_url or f"sqlite+aiosqlite:///{path}"
+
+    report = {"benchmark": "concurrency", "patients": args.patients, "requests": args.requests, "modes": {}}
+    for mode in args.modes:
+        # Each mode runs in a fresh interpreter because the engines are built at import time.
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.concurrency",
+            "--mode",
+            mode,
+            "--database-url",
+            args.database_url,
+            "--patients",
+            str(args.patients),
+            "--requests",
+            str(args.requests),
+            "--concurrency",
+            *map(str, args.concurrency),
+        ]
+        if args.async_database_url:
+            command += ["--async-database-url", args.async_database_url]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report["modes"][mode] = json.loads(output.strip().splitlines()[-1])["results"]
+
+    rendered = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(rendered)
+    print(rendered)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+﻿import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+AUDIENCE = "https://rumahsakit-bench"
+ISSUER = "https://bench.local/"
+KID = "bench-key"
+ROLE_CLAIM = "https://rumahsakit.example.com/roles"
+
+DOCTORS = ["dr. Andi", "dr. Budi", "dr. Citra", "dr. Dewi", "dr. Eka", "dr. Fajar"]
+DIAGNOSES = ["ISPA", "Demam Berdarah", "Tifus", "Hipertensi", "Diabetes", "Gastritis", "Asma"]
+TREATMENTS = ["Rawat jalan", "Rawat inap", "Observasi", "Tindakan minor"]
+
+
+def _b64(number: int) -> str:
+    raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+class LocalAuth0:
+    """Serves a JWKS document on localhost and mints RS256 tokens signed by the matching key."""
+
+    def __init__(self) -> None:
+        import rsa
+
+        public_key, private_key = rsa.newkeys(2048)
+        self.private_pem = private_key.save_pkcs1().decode("ascii")
+        jwk = {"kty": "RSA", "kid": KID, "use": "sig", "alg": "RS256", "n": _b64(public_key.n), "e": _b64(public_key.e)}
+        body = json.dumps({"keys": [jwk]}).encode("utf-8")
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def jwks_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/.well-known/jwks.json"
+
+    def token(self, *, sub: str, email: str, role: str = "dokter", ttl: int = 3600) -> str:
+        from jose import jwt
+
+        claims = {
+            "sub": sub,
+            "email": email,
+            "name": sub,
+            "aud": AUDIENCE,
+            "iss": ISSUER,
+            "iat": int(time.time()),
+            "exp": int(time.time()) + ttl,
+            ROLE_CLAIM: [role],
+        }
+        return jwt.encode(claims, self.private_pem, algorithm="RS256", headers={"kid": KID})
+
+
+def configure_environment(database_url: str, auth: LocalAuth0, **overrides: str) -> None:
+    # Settings are read once at import time, so this must run before anything under app/ is imported.
+    os.environ.update(
+        {
+            "DATABASE_URL": database_url,
+            "AUTH0_DOMAIN": "bench.local",
+            "AUTH0_AUDIENCE": AUDIENCE,
+            "AUTH0_ISSUER": ISSUER,
+            "AUTH0_JWKS_URL": auth.jwks_url,
+            "AUTH0_CUSTOM_ROLE_CLAIM": ROLE_CLAIM,
+            **overrides,
+        }
+    )
+
+
+def synthetic_patients(count: int, *, seed: int = 7, days: int = 3 * 365):
+    rng = random.Random(seed)
+    today = date.today()
+    for index in range(count):
+        visit = today - timedelta(days=rng.randrange(days))
+        yield {
+            "name": f"Pasien {index:07d} {rng.choice(['Siti', 'Agus', 'Rina', 'Joko', 'Wati', 'Bayu'])}",
+            "tanggal_lahir": visit - timedelta(days=rng.randrange(365, 365 * 80)),
+            "tanggal_kunjungan": visit,
+            "diagnosis": rng.choice(DIAGNOSES),
+            "tindakan": rng.choice(TREATMENTS),
+            "dokter": rng.choice(DOCTORS),
+        }
+
+
+def seed_database(patients: int, *, batch_size: int = 10_000) -> None:
+    from app.db.migrations import apply_migrations
+    from app.db.session import SessionLocal, engine
+    from app.models.patient import Patient
+    from app.services.importer import batched
+
+    apply_migrations(engine)
+    with SessionLocal() as db:
+        existing = db.query(Patient).count()
+        if existing >= patients:
+            return
+        from app.crud import patient as patient_crud
+
+        for batch in batched(synthetic_patients(patients - existing, seed=existing), batch_size):
+            patient_crud.bulk_insert_patients(db, batch)
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+async def run_load(client, method: str, url: str, *, requests: int, concurrency: int, **kwargs) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, errors)
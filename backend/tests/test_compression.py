@@ -0,0 +1,178 @@
+﻿import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core.compression import CompressionMiddleware, brotli
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ROWS = [{"id": i, "name": f"Pasien {i}", "diagnosis": "Demam berdarah", "dokter": "dr. Sari"} for i in range(200)]
+CHUNKS = [b"".join(json.dumps(row).encode() + b"\n" for row in ROWS[i : i + 50]) for i in range(0, len(ROWS), 50)]
+
+
+async def large_json(request):
+    return JSONResponse(ROWS)
+
+
+async def small_json(request):
+    return JSONResponse({"status": "ok"})
+
+
+async def xlsx(request):
+    return Response(b"PK\x03\x04" + b"\x00" * 4096, media_type=XLSX)
+
+
+async def ndjson_stream(request):
+    async def body():
+        for chunk in CHUNKS:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def create_app(**options) -> CompressionMiddleware:
+    app = Starlette(
+        routes=[
+            Route("/large", large_json),
+            Route("/small", small_json),
+            Route("/xlsx", xlsx),
+            Route("/stream", ndjson_stream),
+        ]
+    )
+    options.setdefault("content_types", ("application/json", "application/x-ndjson"))
+    return CompressionMiddleware(app, **options)
+
+
+def call(app, path: str, accept_encoding: str | None) -> tuple[dict, list[dict]]:
+    headers = [] if accept_encoding is None else [(b"accept-encoding", accept_encoding.encode())]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    messages: list[dict] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *bodies = messages
+    return {key.decode().lower(): value.decode() for key, value in start["headers"]}, bodies
+
+
+def body_of(bodies: list[dict]) -> bytes:
+    return b"".join(message.get("body", b"") for message in bodies)
+
+
+def identity(path: str) -> bytes:
+    _, bodies = call(create_app(), path, None)
+    return body_of(bodies)
+
+
+def test_large_json_is_gzipped_and_smaller():
+    headers, bodies = call(create_app(brotli_enabled=False), "/large", "gzip")
+    body = body_of(bodies)
+    plain = identity("/large")
+
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(body)
+    assert gzip.decompress(body) == plain
+    assert len(body) < len(plain) / 4
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_is_preferred_when_accepted():
+    headers, bodies = call(create_app(), "/large", "gzip, br")
+
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(body_of(bodies)) == identity("/large")
+
+
+def test_response_below_minimum_size_is_not_compressed():
+    headers, bodies = call(create_app(), "/small", "gzip")
+
+    assert "content-encoding" not in headers
+    assert body_of(bodies) == b'{"status":"ok"}'
+
+
+def test_minimum_size_is_configurable():
+    headers, _ = call(create_app(minimum_size=len(identity("/large")) + 1), "/large", "gzip")
+
+    assert "content-encoding" not in headers
+
+
+def test_content_type_outside_allow_list_is_not_compressed():
+    headers, _ = call(create_app(content_types=("application/x-ndjson",)), "/large", "gzip")
+
+    assert "content-encoding" not in headers
+
+
+def test_xlsx_passes_through_untouched():
+    headers, bodies = call(create_app(), "/xlsx", "gzip, br")
+
+    assert "content-encoding" not in headers
+    assert headers["content-type"] == XLSX
+    assert body_of(bodies) == identity("/xlsx")
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "identity", "gzip;q=0", "gzip;q=0, br;q=0", "*;q=0"])
+def test_refused_encodings_are_not_used(accept_encoding):
+    headers, bodies = call(create_app(), "/large", accept_encoding)
+
+    assert "content-encoding" not in headers
+    assert body_of(bodies) == identity("/large")
+
+
+def test_wildcard_accepts_gzip():
+    headers, _ = call(create_app(brotli_enabled=False), "/large", "*")
+
+    assert headers["content-encoding"] == "gzip"
+
+
+def test_streaming_response_is_gzipped_chunk_by_chunk():
+    headers, bodies = call(create_app(brotli_enabled=False), "/stream", "gzip")
+
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    # Every chunk the app yields is flushed to the client before the next one is produced.
+    decompressor = zlib.decompressobj(31)
+    for message, chunk in zip(bodies, CHUNKS):
+        assert message["more_body"] is True
+        assert decompressor.decompress(message["body"]) == chunk
+    assert bodies[-1]["more_body"] is False
+    assert decompressor.decompress(bodies[-1]["body"]) + decompressor.flush() == b""
+    assert decompressor.eof
+
+    compressed = body_of(bodies)
+    plain = b"".join(CHUNKS)
+    assert gzip.decompress(compressed) == plain
+    assert len(compressed) < len(plain) / 4
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_streaming_response_is_brotli_encoded_chunk_by_chunk():
+    headers, bodies = call(create_app(), "/stream", "br")
+
+    assert headers["content-encoding"] == "br"
+    decompressor = brotli.Decompressor()
+    for message, chunk in zip(bodies, CHUNKS):
+        assert decompressor.process(message["body"]) == chunk
+    assert brotli.decompress(body_of(bodies)) == b"".join(CHUNKS)
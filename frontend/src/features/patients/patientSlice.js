@@ -17,6 +17,9 @@ const baseState = {
     summary: {
       total_patients: 0,
       total_today: 0,
+      by_day: [],
+      by_doctor: [],
+      by_diagnosis: [],
     },
   },
   current: null,
@@ -85,14 +85,15 @@ const Dashboard = () => {
   const patients = useMemo(() => report.patients ?? items ?? [], [report.patients, items]);
 
   const chartData = useMemo(() => {
-    if (!patients.length) return [];
+    const byDoctor = report.summary?.by_doctor ?? [];
+    if (!byDoctor.length) return [];
     const counts = new Map();
-    patients.forEach((patient) => {
-      const label = patient.dokter?.trim() || "Belum ditugaskan";
-      counts.set(label, (counts.get(label) ?? 0) + 1);
+    byDoctor.forEach(({ label, count }) => {
+      const name = label?.trim() || "Belum ditugaskan";
+      counts.set(name, (counts.get(name) ?? 0) + count);
     });
     return Array.from(counts.entries()).map(([label, value]) => ({ label, value }));
-  }, [patients]);
+  }, [report.summary]);
 
   const isFetching = status === "loading" || authLoading;
 